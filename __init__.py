@@ -1,3 +1,4 @@
+import codecs
 import functools
 import os
 import os.path
@@ -10,9 +11,19 @@ from typing import Union
 import sublime
 import sublime_plugin
 
+from .gitdir import find_git_dir
+from .perf import record
+from .process import git_popen, resolve_executable
+from .reload import RefreshPass
+
 git_root_cache = {}
 _has_warned = False
 
+# Git output is read and decoded in slices of this many bytes
+DECODE_CHUNK_SIZE = 1 << 20
+# Seconds a cancelled git gets to exit on SIGTERM before it is killed
+CANCEL_GRACE_PERIOD = 2.0
+
 
 # Goal is to get: "Packages/Git", allowing for people who rename things
 def find_plugin_directory():
@@ -108,11 +119,81 @@ def goto_xy(view, line, col):
         view.run_command("move", {"by": "characters", "forward": True})
 
 
+class SafeishDecoder(object):
+    # Incremental version of _make_text_safeish. Output is decoded as UTF-8,
+    # only the bytes that aren't go through the fallback encoding, so one
+    # stray Latin-1 byte doesn't garble the rest of its chunk.
+    def __init__(self, fallback_encoding):
+        try:
+            fallback = codecs.lookup(fallback_encoding).name
+        except LookupError:
+            fallback = "utf-8"
+        self.errors = _fallback_errors(fallback)
+        # The start of a character the last chunk ended in
+        self.pending = b""
+
+    def decode(self, chunk, final=False):
+        data = self.pending + chunk if self.pending else chunk
+        text, consumed = codecs.utf_8_decode(data, self.errors, final)
+        self.pending = bytes(data[consumed:])
+        return text
+
+
+def _fallback_errors(encoding):
+    # Name of a codec error handler that decodes just the bytes that aren't
+    # UTF-8 with the fallback encoding
+    name = "git-fallback-" + encoding
+    try:
+        codecs.lookup_error(name)
+    except LookupError:
+        codecs.register_error(
+            name,
+            lambda e: (str(e.object[e.start : e.end], encoding, "replace"), e.end),
+        )
+    return name
+
+
+def _decode_chunks(chunks, fallback_encoding):
+    decoder = SafeishDecoder(fallback_encoding)
+    parts = [decoder.decode(chunk) for chunk in chunks]
+    parts.append(decoder.decode(b"", True))
+    return "".join(parts)
+
+
+def _read_safeish(pipe, fallback_encoding):
+    # Decodes a pipe as it is read, so the raw bytes never exist in full
+    # next to the decoded string. Returns the text and the number of bytes read.
+    buffer = bytearray(DECODE_CHUNK_SIZE)
+    view = memoryview(buffer)
+    total = 0
+
+    def chunks():
+        nonlocal total
+        while True:
+            size = pipe.readinto(buffer)
+            if not size:
+                return
+            total += size
+            yield view[:size]
+
+    text = _decode_chunks(chunks(), fallback_encoding)
+    return text, total
+
+
 def _make_text_safeish(text, fallback_encoding, method="decode"):
     # The unicode decode here is because sublime converts to unicode inside
     # insert in such a way that unknown characters will cause errors, which is
     # distinctly non-ideal... and there's no way to tell what's coming out of
     # git in output. So...
+    if method == "decode" and isinstance(text, (bytes, bytearray, memoryview)):
+        view = memoryview(text)
+        return _decode_chunks(
+            (
+                view[i : i + DECODE_CHUNK_SIZE]
+                for i in range(0, len(view), DECODE_CHUNK_SIZE)
+            ),
+            fallback_encoding,
+        )
     try:
         unitext = getattr(text, method)("utf-8")
     except (UnicodeEncodeError, UnicodeDecodeError):
@@ -162,6 +243,68 @@ def find_binary(cmd):
 GIT = find_binary("git")
 
 
+class Invocation(object):
+    # Everything about launching git that only depends on the settings and
+    # the environment, resolved again only when one of them changes.
+    def __init__(self):
+        s = sublime.load_settings("Git.sublime-settings")
+        us = sublime.load_settings("Preferences.sublime-settings")
+        self.git_flow = s.get("git_flow_command")
+        self.save_first = s.get("save_first")
+        self.shell = sublime.platform() == "windows"
+        # What os.environ was when this was resolved
+        self.environ = dict(_environ())
+        # Shared by every process, so it must never be modified
+        self.env = os.environ.copy()
+        if self.shell and "HOME" not in self.env:
+            self.env["HOME"] = self.env["HOMEDRIVE"] + self.env["HOMEPATH"]
+        # An absolute path lets git_popen use posix_spawn
+        self.git = resolve_executable(
+            s.get("git_command") or us.get("git_binary") or GIT or "git",
+            self.env.get("PATH"),
+        )
+
+
+_invocation = None
+_invocation_watched = False
+
+
+def _environ():
+    # The undecoded mapping under os.environ, compared in a microsecond where
+    # os.environ itself takes a hundred times longer
+    return getattr(os.environ, "_data", os.environ)
+
+
+def _forget_invocation():
+    global _invocation
+    _invocation = None
+
+
+def resolved_invocation():
+    global _invocation, _invocation_watched
+    if not _invocation_watched:
+        for name in ("Git.sublime-settings", "Preferences.sublime-settings"):
+            sublime.load_settings(name).add_on_change(
+                "git-invocation", _forget_invocation
+            )
+        _invocation_watched = True
+    invocation = _invocation
+    # Other plugins may fix up PATH and such after this one loaded
+    if invocation is None or invocation.environ != _environ():
+        invocation = _invocation = Invocation()
+    return invocation
+
+
+def git_binary():
+    return resolved_invocation().git
+
+
+@functools.lru_cache(maxsize=None)
+def parse_fallback_encoding(setting):
+    # "Western (Windows 1252)" -> "Windows 1252"
+    return str(setting.rpartition("(")[2].rpartition(")")[0])
+
+
 def output_error_message(output, *args, **kwargs):
     # print('error', output, args, kwargs)
     sublime.error_message(output)
@@ -177,9 +320,13 @@ class CommandThread(threading.Thread):
         working_dir="",
         fallback_encoding="",
         error_suppresses_output=False,
+        refresh=None,
+        invocation=None,
+        caller="",
         **kwargs,
     ):
         threading.Thread.__init__(self)
+        self.created = time.perf_counter()
         self.command = command
         self.on_done = on_done
         self.working_dir = working_dir
@@ -199,16 +346,51 @@ class CommandThread(threading.Thread):
 
         self.fallback_encoding = fallback_encoding
         self.error_suppresses_output = error_suppresses_output
+        self.refresh = refresh
+        self.invocation = invocation or resolved_invocation()
+        self.caller = caller
         self.kwargs = kwargs
+        self.proc: Union[None, subprocess.Popen] = None
+        self.proc_lock = threading.Lock()
+        self.cancelled = False
+
+    def cancel(self):
+        # Stops the command, whether it is still waiting for command_lock or
+        # already running. The callback isn't called for a cancelled command.
+        with self.proc_lock:
+            self.cancelled = True
+            proc = self.proc
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.terminate()
+        except OSError:
+            return
+        timer = threading.Timer(CANCEL_GRACE_PERIOD, self.kill, (proc,))
+        timer.daemon = True
+        timer.start()
+
+    def kill(self, proc):
+        # Whatever ignored SIGTERM. A no-op once the process has been waited for.
+        try:
+            proc.kill()
+        except OSError:
+            pass
 
     def run(self):
         # Ignore directories that no longer exist
-        if not os.path.isdir(self.working_dir):
+        if not os.path.isdir(self.working_dir) or self.cancelled:
             return
 
+        # Outside command_lock, the refresh pass runs git and reads every
+        # open view, other commands needn't queue behind that
+        if self.refresh:
+            self.refresh.snapshot()
         self.command_lock.acquire()
+        started = time.perf_counter()
         output = ""
         callback = self.on_done
+        proc = None
         try:
             cwd: Union[None, str] = None
             if self.working_dir != "":
@@ -219,27 +401,52 @@ class CommandThread(threading.Thread):
                 startupinfo = subprocess.STARTUPINFO()
                 startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
 
-            env = os.environ.copy()
-
-            shell = False
-            if sublime.platform() == "windows":
-                shell = True
-                if "HOME" not in env:
-                    env[str("HOME")] = str(env["HOMEDRIVE"]) + str(env["HOMEPATH"])
-
             # universal_newlines seems to break `log` in python3
-            proc = subprocess.Popen(
-                self.command,
+            popen_kwargs = dict(
                 stdout=self.stdout,
                 stderr=subprocess.STDOUT,
                 stdin=subprocess.PIPE,
                 startupinfo=startupinfo,
-                shell=shell,
+                shell=self.invocation.shell,
                 universal_newlines=False,
-                env=env,
-                cwd=cwd,
+                env=self.invocation.env,
+            )
+            with self.proc_lock:
+                # Cancelled while waiting for the lock
+                if self.cancelled:
+                    return
+                if self.command[0] == self.invocation.git:
+                    proc = git_popen(
+                        self.command[0], self.command[1:], cwd, **popen_kwargs
+                    )
+                else:
+                    proc = subprocess.Popen(self.command, cwd=cwd, **popen_kwargs)
+                self.proc = proc
+            spawned = time.perf_counter()
+            if self.stdin is None and self.stdout == subprocess.PIPE:
+                proc.stdin.close()
+                output, output_bytes = _read_safeish(
+                    proc.stdout, self.fallback_encoding
+                )
+                proc.stdout.close()
+                proc.wait()
+            else:
+                output = proc.communicate(self.stdin)[0]
+                output_bytes = len(output or b"")
+            if self.cancelled:
+                # Killed on purpose, not a run to time nor one whose changes
+                # anybody waits for
+                return
+            record(
+                self.command,
+                git_root(self.working_dir) or self.working_dir,
+                self.caller,
+                started - self.created,
+                spawned - started,
+                time.perf_counter() - spawned,
+                output_bytes,
+                proc.returncode,
             )
-            output = proc.communicate(self.stdin)[0]
             if (
                 self.error_suppresses_output
                 and proc.returncode is not None
@@ -272,8 +479,15 @@ class CommandThread(threading.Thread):
         finally:
             self.command_lock.release()
 
-            if (
+            # Whatever git got to change before it failed is reloaded too
+            if self.refresh and proc is not None and not self.cancelled:
+                self.refresh.run()
+            if self.cancelled:
+                # Whoever cancelled it no longer wants the output
+                pass
+            elif (
                 self.is_generic_callback == True
+                and proc is not None
                 and proc.returncode == 0
                 and output is not None
                 and output != ""
@@ -303,73 +517,85 @@ class GitCommand(object):
         show_status=True,
         filter_empty_args=True,
         no_save=False,
+        refresh=None,
         **kwargs,
-    ) -> None:
+    ) -> CommandThread:
         if filter_empty_args:
             command = [arg for arg in command if arg]
         if "working_dir" not in kwargs:
             kwargs[str("working_dir")] = str(self.get_working_dir())
-        if (
-            "fallback_encoding" not in kwargs
-            and self.active_view()
-            and self.active_view().settings().get("fallback_encoding")
-        ):
-            kwargs[str("fallback_encoding")] = str(
-                self.active_view()
-                .settings()
-                .get("fallback_encoding")
-                .rpartition("(")[2]
-                .rpartition(")")[0]
-            )
+        invocation = resolved_invocation()
+        view = self.active_view()
+        if "fallback_encoding" not in kwargs and view:
+            fallback_encoding = view.settings().get("fallback_encoding")
+            if fallback_encoding:
+                kwargs["fallback_encoding"] = parse_fallback_encoding(
+                    fallback_encoding
+                )
 
-        s = sublime.load_settings("Git.sublime-settings")
         if (
-            s.get("save_first")
-            and self.active_view()
-            and self.active_view().file_name()
-            and self.active_view().is_dirty()
+            invocation.save_first
+            and view
+            and view.file_name()
+            and view.is_dirty()
             and not no_save
         ):
-            self.active_view().run_command("save")
+            view.run_command("save")
+        git = invocation.git
         if command[0] == "git":
-            if command[1] == "flow" and s.get("git_flow_command"):
-                command[0] = s.get("git_flow_command")
+            if command[1] == "flow" and invocation.git_flow:
+                command[0] = invocation.git_flow
                 del command[1]
             else:
-                us = sublime.load_settings("Preferences.sublime-settings")
-                if s.get("git_command") or us.get("git_binary"):
-                    command[0] = s.get("git_command") or us.get("git_binary")
-                elif GIT:
-                    command[0] = GIT
+                command[0] = git
         if not callback:
             callback = self.generic_done
             kwargs["is_generic_callback"] = True
-
-        thread = CommandThread(command, callback, **kwargs)
+            if refresh is None:
+                refresh = self.may_change_files
+        if refresh and git_root(kwargs["working_dir"]):
+            kwargs["refresh"] = RefreshPass(git, git_root(kwargs["working_dir"]))
+
+        thread = CommandThread(
+            command,
+            callback,
+            invocation=invocation,
+            caller=type(self).__name__,
+            **kwargs,
+        )
         thread.start()
 
         if show_status:
             message = kwargs.get("status_message", False) or " ".join(command)
             sublime.status_message(message)
+        return thread
+
+    def run_latest_command(
+        self, key, command, callback=None, **kwargs
+    ) -> CommandThread:
+        # run_command, cancelling what the previous call with the same key
+        # started if it is still going. For commands whose earlier output is
+        # of no use.
+        if not hasattr(self, "latest_commands"):
+            self.latest_commands = {}
+        previous = self.latest_commands.get(key)
+        if previous is not None:
+            previous.cancel()
+        thread = self.latest_commands[key] = self.run_command(
+            command, callback, **kwargs
+        )
+        return thread
 
     def generic_done(self, result, **kw):
+        # Clean views of changed files have already been reloaded by the
+        # command's RefreshPass, dirty ones are left for the user to deal with.
         if (
             self.may_change_files
             and self.active_view()
             and self.active_view().file_name()
+            and self.active_view().is_dirty()
         ):
-            if self.active_view().is_dirty():
-                result = "WARNING: Current view is dirty.\n\n"
-            else:
-                # just asking the current file to be re-opened doesn't do anything
-                print("reverting")
-                position = self.active_view().viewport_position()
-                self.active_view().run_command("revert")
-                do_when(
-                    lambda: not self.active_view().is_loading(),
-                    lambda: self.active_view().set_viewport_position(position, False),
-                )
-                # self.active_view().show(position)
+            result = "WARNING: Current view is dirty.\n\n"
 
         view = self.active_view()
         if view and view.settings().get("live_git_annotations"):
@@ -424,6 +650,11 @@ class GitCommand(object):
             root = self.active_view().settings().get("git_root_dir")
         view.settings().set("git_root_dir", root)
 
+    def get_git_dir(self):
+        # The .git directory, for reading state without spawning git
+        root = git_root(self.get_working_dir())
+        return find_git_dir(root) if root else None
+
     def active_file_path(self):
         view = self.active_view()
         if view and view.file_name() and len(view.file_name()) > 0:
@@ -451,12 +682,8 @@ class GitWindowCommand(GitCommand, sublime_plugin.WindowCommand):
         if self.active_view() and self.active_view().settings().get(
             "fallback_encoding"
         ):
-            return (
-                self.active_view()
-                .settings()
-                .get("fallback_encoding")
-                .rpartition("(")[2]
-                .rpartition(")")[0]
+            return parse_fallback_encoding(
+                self.active_view().settings().get("fallback_encoding")
             )
 
     # If there's no active view or the active view is not a file on the
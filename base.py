@@ -2,83 +2,135 @@ import os
 import re
 import subprocess
 from abc import ABCMeta, abstractmethod
-from typing import List, Union
+from typing import List, Tuple, Union
 from urllib.parse import parse_qs, urlparse
 
 import sublime
 from sublime import View
 
-from .settings import PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS, pkg_settings
+from . import git_binary, git_root
+from .blamecache import BLAME_ARGS, cached_blame, lookup
+from .commits import BlameCommit, blame_commit
+from .process import git_output
+from .settings import (
+    PKG_SETTINGS_KEY_BLAME_FLAGS,
+    PKG_SETTINGS_KEY_BLAME_UPGRADE_BUDGET,
+    PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS,
+    pkg_settings,
+)
+
+
+BLAME_LINE = re.compile(
+    r"""(?x)
+    ^   (?P<sha>\^?\w+)
+    \s+ (?P<file>[\S ]+)
+    \s+
+    \(  (?P<author>.+?)
+    \s+ (?P<date>\d{4}-\d{2}-\d{2})
+    \s+ (?P<time>\d{2}:\d{2}:\d{2})
+    \s+ (?P<timezone>[\+-]\d+)
+    \s+ (?P<line_number>\d+)
+    \)
+    \s
+    """
+)
+
+
+def blame_flags(kind: str, upgraded: bool = False) -> List[str]:
+    # The flags of a kind's quick blame, or of the thorough one it is
+    # upgraded to
+    custom_flags = pkg_settings().get(PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS, [])
+    if upgraded:
+        return custom_flags
+    profiles = pkg_settings().get(PKG_SETTINGS_KEY_BLAME_FLAGS) or {}
+    return profiles.get(kind, custom_flags)
+
+
+def upgrade_budget(kind: str) -> Union[float, None]:
+    # Seconds the thorough blame may take, None when there is nothing to
+    # upgrade to
+    budget = pkg_settings().get(PKG_SETTINGS_KEY_BLAME_UPGRADE_BUDGET, 0)
+    if not budget or blame_flags(kind, True) == blame_flags(kind):
+        return None
+    return budget / 1000
 
 
 class BaseBlame(metaclass=ABCMeta):
-    def run_git(self, view_file_path: str, cli_args: List[str]) -> str:
-        cmd_line = ["git"] + cli_args
-
-        return subprocess.check_output(
-            cmd_line,
-            cwd=os.path.dirname(os.path.realpath(view_file_path)),
-            stderr=subprocess.STDOUT,
+    # Which entry of the blame_flags setting applies
+    blame_kind = ""
+
+    def run_git(
+        self, view_file_path: str, cli_args: List[str], timeout=None, on_spawn=None
+    ) -> str:
+        return git_output(
+            git_binary(),
+            cli_args,
+            os.path.dirname(os.path.realpath(view_file_path)),
+            caller=type(self).__name__,
+            timeout=timeout,
+            on_spawn=on_spawn,
         ).decode()
 
+    def blame_flags(self, upgraded: bool = False) -> List[str]:
+        return blame_flags(self.blame_kind, upgraded)
+
+    def upgrade_budget(self) -> Union[float, None]:
+        return upgrade_budget(self.blame_kind)
+
     def get_commit_desc(self, sha: str, path: str) -> str:
         cli_args = ["rev-list", "--format=%B", "--max-count=1", sha.strip("^")]
         return self.run_git(path, cli_args)
 
-    def get_blame_text(self, path: str, **kwargs: List[str]):
-        cli_args = ["blame", "--show-name", "--minimal"]
+    def get_blame_text(
+        self, path: str, upgraded: bool = False, on_spawn=None, **kwargs: List[str]
+    ):
+        cli_args = list(BLAME_ARGS)
         cli_args.extend(self.extra_cli_args(**kwargs))
-        cli_args.extend(pkg_settings().get(PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS, []))
+        cli_args.extend(self.blame_flags(upgraded))
         cli_args.extend(["--", os.path.basename(path)])
-        return self.run_git(path, cli_args)
+        timeout = self.upgrade_budget() if upgraded else None
+        return self.run_git(path, cli_args, timeout, on_spawn)
+
+    def get_full_blame_text(self, path: str, upgraded: bool = False) -> str:
+        # Blame of the whole file, shared with the other blames of it through
+        # the blame cache
+        return cached_blame(
+            git_binary(),
+            git_root(os.path.dirname(os.path.realpath(path))),
+            path,
+            self.blame_flags(upgraded),
+            caller=type(self).__name__,
+            timeout=self.upgrade_budget() if upgraded else None,
+        )
+
+    def cached_full_blame_text(self, path: str, upgraded: bool = False):
+        # Like get_full_blame_text, but None instead of running git
+        return lookup(
+            git_root(os.path.dirname(os.path.realpath(path))),
+            path,
+            self.blame_flags(upgraded),
+        )
 
     def get_commit_fulltext(self, sha: str, path: str):
         cli_args = ["show", "--no-color", sha]
         return self.run_git(path, cli_args)
 
-    def get_commit_message_subject(self, sha: str, path: str):
-        cli_args = ["show", "--no-color", sha, "--pretty=format:%s", "--no-patch"]
-        return self.run_git(path, cli_args)
-
     @classmethod
     def parse_line(cls, line: str):
-        pattern = r"""(?x)
-            ^   (?P<sha>\^?\w+)
-            \s+ (?P<file>[\S ]+)
-            \s+
-            \(  (?P<author>.+?)
-            \s+ (?P<date>\d{4}-\d{2}-\d{2})
-            \s+ (?P<time>\d{2}:\d{2}:\d{2})
-            \s+ (?P<timezone>[\+-]\d+)
-            \s+ (?P<line_number>\d+)
-            \)
-            \s
-            """
-        # re's module-level functions like match(...) internally cache the compiled form of pattern strings.
-        m = re.match(pattern, line)
+        m = BLAME_LINE.match(line)
         return cls.postprocess_parse_result(m)
 
-    # @todo Add a test for the `parse_line_with_relative_date` function in test_parsing.py
     @classmethod
-    def parse_line_with_relative_date(cls, line):
-        """
-        The difference from parse_line is that date/time/timezone are replaced with relative_date
-        to be able to parse human readable format
-        https://github.com/git/git/blob/c09b6306c6ca275ed9d0348a8c8014b2ff723cfb/date.c#L131
-        """
-        pattern = r"""(?x)
-            ^   (?P<sha>\^?\w+)
-            \s+ (?P<file>[\S ]+)
-            \s+
-            \(  (?P<author>.+?)
-            \s+ (?P<relative_date>\d+.+ago)
-            \s+ (?P<line_number>\d+)
-            \)
-            \s
-            """
-        # re's module-level functions like match(...) internally cache the compiled form of pattern strings.
-        m = re.match(pattern, line)
-        return cls.postprocess_parse_result(m)
+    def parse_blame(cls, text: str, root: str) -> List[Tuple[BlameCommit, int]]:
+        # The commit and line number of every line, without a dict per line
+        blames = []
+        for line in text.splitlines():
+            m = BLAME_LINE.match(line)
+            if m:
+                sha, _, author, date, time, timezone, line_number = m.groups()
+                commit = blame_commit(root, sha, author, date, time, timezone)
+                blames.append((commit, int(line_number)))
+        return blames
 
     @classmethod
     def postprocess_parse_result(cls, match):
@@ -112,16 +164,15 @@ class BaseBlame(metaclass=ABCMeta):
                 "blame_insert_commit_description",
                 {"desc": desc, "scratch_view_name": "commit " + sha},
             )
-        elif url.path == "prev":
-            sha = querystring["sha"][0]
+        elif url.path in ("prev", "next"):
             row_num = querystring["row_num"][0]
-            sha_skip_list = querystring.get("skip", [])
-            if sha not in sha_skip_list:
-                sha_skip_list.append(sha)
+            # How far back in the line's history the phantom currently is
+            index = int(querystring.get("index", ["0"])[0])
+            index += 1 if url.path == "prev" else -1
             self.rerun(
                 prevving=True,
                 fixed_row_num=int(row_num),
-                sha_skip_list=sha_skip_list,
+                history_index=max(index, 0),
             )
         elif url.path == "close":
             self.close_by_user_request()
@@ -0,0 +1,805 @@
+# A headless stand-in for the sublime module, good enough to import the plugin
+# and drive its commands end to end outside of Sublime Text.
+#
+# Views and windows are handles onto state kept here, like the real ones, so
+# sublime.View(view_id) works from any thread. Views hold their real text,
+# settings notify their listeners, phantoms are kept per view and
+# set_timeout callbacks run on a deterministic loop with a virtual clock:
+# nothing runs until run_until_idle() is called, callbacks run in the order
+# they are due and delays cost no wall time. Quick and input panels take
+# their answers from queues filled in by the caller.
+import bisect
+import heapq
+import itertools
+import os
+import threading
+import time
+import traceback
+
+HOVER_TEXT = 1
+HOVER_GUTTER = 2
+HOVER_MARGIN = 3
+
+LAYOUT_INLINE = 0
+LAYOUT_BELOW = 1
+LAYOUT_BLOCK = 2
+
+COOPERATE_WITH_AUTO_COMPLETE = 2
+HIDE_ON_MOUSE_MOVE = 4
+HIDE_ON_MOUSE_MOVE_AWAY = 8
+
+MONOSPACE_FONT = 1
+KEEP_OPEN_ON_FOCUS_LOST = 2
+
+ENCODED_POSITION = 1
+TRANSIENT = 4
+FORCE_GROUP = 8
+
+DRAW_EMPTY = 1
+HIDE_ON_MINIMAP = 2
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+
+# Everything the plugin told the user, for scenarios to look at
+status_messages = []
+error_messages = []
+# (target, name, args) of every run_command() call
+command_log = []
+# Answer for ok_cancel_dialog and friends
+dialog_answer = True
+
+_clipboard = ""
+_settings = {}
+_views = {}
+_windows = {}
+_active_window_id = None
+_ids = itertools.count(1)
+
+
+class _Loop(object):
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+
+    def schedule(self, callback, delay):
+        with self.condition:
+            due = self.now + max(0, delay or 0)
+            heapq.heappush(self.queue, (due, next(self.order), callback))
+            self.condition.notify_all()
+
+    def next_callback(self, deadline):
+        with self.condition:
+            while not self.queue:
+                if not _worker_threads():
+                    return None
+                if time.monotonic() > deadline:
+                    raise TimeoutError("worker threads are still running")
+                self.condition.wait(0.005)
+            if time.monotonic() > deadline:
+                # Something keeps scheduling itself, like a progress status
+                # nobody stops
+                raise TimeoutError("callbacks are still being scheduled")
+            due, _, callback = heapq.heappop(self.queue)
+            self.now = max(self.now, due)
+            return callback
+
+
+_loop = _Loop()
+
+
+def _worker_threads():
+    # Threads that may still schedule callbacks. Daemon threads are expected
+    # to live forever, so they don't count.
+    return [
+        thread
+        for thread in threading.enumerate()
+        if thread is not threading.main_thread() and not thread.daemon
+    ]
+
+
+def run_until_idle(timeout=60.0):
+    # Runs due callbacks, like the editor's main thread would, until none are
+    # left and no worker thread could schedule another. Returns how many ran.
+    deadline = time.monotonic() + timeout
+    count = 0
+    while True:
+        callback = _loop.next_callback(deadline)
+        if callback is None:
+            return count
+        count += 1
+        try:
+            callback()
+        except Exception:
+            traceback.print_exc()
+
+
+def now():
+    # Milliseconds on the loop's virtual clock
+    return _loop.now
+
+
+def set_timeout(callback, delay=0):
+    _loop.schedule(callback, delay)
+
+
+def set_timeout_async(callback, delay=0):
+    _loop.schedule(callback, delay)
+
+
+class Region(object):
+    __slots__ = ("a", "b", "xpos")
+
+    def __init__(self, a, b=None, xpos=-1):
+        self.a = a
+        self.b = a if b is None else b
+        self.xpos = xpos
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def empty(self):
+        return self.a == self.b
+
+    def contains(self, x):
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+    def intersects(self, other):
+        return self.begin() < other.end() and other.begin() < self.end()
+
+    def to_tuple(self):
+        return (self.a, self.b)
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and self.to_tuple() == other.to_tuple()
+
+    def __hash__(self):
+        return hash(self.to_tuple())
+
+    def __len__(self):
+        return self.size()
+
+    def __repr__(self):
+        return "Region({0}, {1})".format(self.a, self.b)
+
+
+class Selection(object):
+    def __init__(self):
+        self.regions = []
+
+    def __iter__(self):
+        return iter(list(self.regions))
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __getitem__(self, index):
+        return self.regions[index]
+
+    def clear(self):
+        self.regions = []
+
+    def add(self, x):
+        self.regions.append(x if isinstance(x, Region) else Region(x))
+        self.regions.sort(key=Region.begin)
+
+    def add_all(self, regions):
+        for region in regions:
+            self.add(region)
+
+    def contains(self, region):
+        return any(r.contains(region) for r in self.regions)
+
+
+class Edit(object):
+    def __init__(self, view_id=0):
+        self.view_id = view_id
+
+
+class Settings(object):
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.listeners = {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def has(self, key):
+        return key in self.values
+
+    def set(self, key, value):
+        self.values[key] = value
+        self.changed()
+
+    def erase(self, key):
+        if key in self.values:
+            del self.values[key]
+            self.changed()
+
+    def to_dict(self):
+        return dict(self.values)
+
+    def add_on_change(self, tag, callback):
+        self.listeners.setdefault(tag, []).append(callback)
+
+    def clear_on_change(self, tag):
+        self.listeners.pop(tag, None)
+
+    def changed(self):
+        for callbacks in list(self.listeners.values()):
+            for callback in callbacks:
+                callback()
+
+
+def load_settings(name):
+    if name not in _settings:
+        _settings[name] = Settings()
+    return _settings[name]
+
+
+def save_settings(name):
+    pass
+
+
+class Phantom(object):
+    def __init__(self, region, content, layout, on_navigate=None):
+        self.region = region
+        self.content = content
+        self.layout = layout
+        self.on_navigate = on_navigate
+        self.id = None
+
+
+class PhantomSet(object):
+    def __init__(self, view, key=""):
+        self.view = view
+        self.key = key
+        self.phantoms = []
+
+    def update(self, phantoms):
+        self.view.erase_phantoms(self.key)
+        for phantom in phantoms:
+            phantom.id = self.view.add_phantom(
+                self.key,
+                phantom.region,
+                phantom.content,
+                phantom.layout,
+                phantom.on_navigate,
+            )
+        self.phantoms = list(phantoms)
+
+
+class _ViewState(object):
+    def __init__(self, window_id, file_name=None, text="", panel=False):
+        self.window_id = window_id
+        self.file_name = file_name
+        self.name = ""
+        self.panel = panel
+        self.valid = True
+        self.scratch = False
+        self.read_only = False
+        self.dirty = False
+        self.change_count = 0
+        self.syntax = ""
+        self.settings = Settings()
+        self.selection = Selection()
+        self.selection.add(Region(0))
+        self.status = {}
+        self.popup = None
+        # key -> {phantom id: (region, content, layout, on_navigate)}
+        self.phantoms = {}
+        self.viewport = (0.0, 0.0)
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.text = text
+        starts = [0]
+        position = text.find("\n")
+        while position != -1:
+            starts.append(position + 1)
+            position = text.find("\n", position + 1)
+        self.line_starts = starts
+
+
+class View(object):
+    def __init__(self, view_id):
+        self.view_id = view_id
+
+    @property
+    def _state(self):
+        return _views[self.view_id]
+
+    def __eq__(self, other):
+        return isinstance(other, View) and other.view_id == self.view_id
+
+    def __hash__(self):
+        return self.view_id
+
+    def __repr__(self):
+        return "View({0})".format(self.view_id)
+
+    def id(self):
+        return self.view_id
+
+    def buffer_id(self):
+        return self.view_id
+
+    def is_valid(self):
+        return self.view_id in _views and self._state.valid
+
+    def is_primary(self):
+        return True
+
+    def element(self):
+        return "output:output" if self._state.panel else None
+
+    def window(self):
+        if not self.is_valid() or self._state.panel:
+            return None
+        window_id = self._state.window_id
+        return Window(window_id) if window_id in _windows else None
+
+    def close(self):
+        import sublime_plugin
+
+        sublime_plugin.on_event("on_pre_close", self)
+        self._state.valid = False
+        window = _windows.get(self._state.window_id)
+        if window and self.view_id in window.view_ids:
+            window.view_ids.remove(self.view_id)
+        sublime_plugin.on_event("on_close", self)
+        return True
+
+    def file_name(self):
+        return self._state.file_name
+
+    def name(self):
+        return self._state.name
+
+    def set_name(self, name):
+        self._state.name = name
+
+    def is_loading(self):
+        return False
+
+    def is_dirty(self):
+        return self._state.dirty
+
+    def is_read_only(self):
+        return self._state.read_only
+
+    def set_read_only(self, read_only):
+        self._state.read_only = read_only
+
+    def is_scratch(self):
+        return self._state.scratch
+
+    def set_scratch(self, scratch):
+        self._state.scratch = scratch
+
+    def change_count(self):
+        return self._state.change_count
+
+    def settings(self):
+        return self._state.settings
+
+    def syntax(self):
+        return self._state.syntax
+
+    def set_syntax_file(self, syntax):
+        self._state.syntax = syntax
+
+    def assign_syntax(self, syntax):
+        self._state.syntax = syntax
+
+    def scope_name(self, point):
+        return "text.plain "
+
+    def match_selector(self, point, selector):
+        return False
+
+    def find_by_selector(self, selector):
+        return []
+
+    # Text ---------------------------------------------------------------------
+
+    def size(self):
+        return len(self._state.text)
+
+    def substr(self, x):
+        text = self._state.text
+        if isinstance(x, Region):
+            return text[x.begin() : x.end()]
+        return text[x : x + 1]
+
+    def rowcol(self, point):
+        starts = self._state.line_starts
+        row = bisect.bisect_right(starts, point) - 1
+        return row, point - starts[row]
+
+    def text_point(self, row, col):
+        starts = self._state.line_starts
+        row = max(0, min(row, len(starts) - 1))
+        return min(starts[row] + col, self.size())
+
+    def line(self, x):
+        point = x.begin() if isinstance(x, Region) else x
+        begin = self._state.line_starts[self.rowcol(point)[0]]
+        end = self._state.text.find("\n", begin)
+        return Region(begin, self.size() if end == -1 else end)
+
+    def full_line(self, x):
+        line = self.line(x)
+        return Region(line.a, min(line.b + 1, self.size()))
+
+    def lines(self, region):
+        lines = []
+        point = region.begin()
+        while True:
+            line = self.line(point)
+            lines.append(line)
+            if line.b >= region.end() or line.b >= self.size():
+                return lines
+            point = line.b + 1
+
+    def sel(self):
+        return self._state.selection
+
+    def _replace_text(self, begin, end, text):
+        import sublime_plugin
+
+        state = self._state
+        state.set_text(state.text[:begin] + text + state.text[end:])
+        state.change_count += 1
+        if not state.scratch:
+            state.dirty = True
+        sublime_plugin.on_event("on_modified", self)
+
+    def insert(self, edit, point, text):
+        self._replace_text(point, point, text)
+        return len(text)
+
+    def erase(self, edit, region):
+        self._replace_text(region.begin(), region.end(), "")
+
+    def replace(self, edit, region, text):
+        self._replace_text(region.begin(), region.end(), text)
+
+    def run_command(self, name, args=None):
+        import sublime_plugin
+
+        command_log.append((self, name, args))
+        if sublime_plugin.run_text_command(self, name, args or {}):
+            return
+        _builtin_text_command(self, name, args or {})
+
+    # Status, popups and phantoms ----------------------------------------------
+
+    def set_status(self, key, value):
+        self._state.status[key] = value
+
+    def get_status(self, key):
+        return self._state.status.get(key, "")
+
+    def erase_status(self, key):
+        self._state.status.pop(key, None)
+
+    def show_popup(self, content, flags=0, location=-1, **kwargs):
+        self._state.popup = content
+
+    def update_popup(self, content):
+        self._state.popup = content
+
+    def hide_popup(self):
+        self._state.popup = None
+
+    def is_popup_visible(self):
+        return self._state.popup is not None
+
+    def add_phantom(self, key, region, content, layout, on_navigate=None):
+        phantom_id = next(_ids)
+        phantom = (region, content, layout, on_navigate)
+        self._state.phantoms.setdefault(key, {})[phantom_id] = phantom
+        return phantom_id
+
+    def erase_phantoms(self, key):
+        self._state.phantoms.pop(key, None)
+
+    def erase_phantom_by_id(self, phantom_id):
+        for phantoms in self._state.phantoms.values():
+            phantoms.pop(phantom_id, None)
+
+    def query_phantoms(self, key=""):
+        return list(self._state.phantoms.get(key, {}).values())
+
+    # Layout -------------------------------------------------------------------
+
+    def layout_extent(self):
+        return (800.0, 16.0 * len(self._state.line_starts))
+
+    def viewport_extent(self):
+        return (800.0, 600.0)
+
+    def viewport_position(self):
+        return self._state.viewport
+
+    def set_viewport_position(self, position, animate=True):
+        self._state.viewport = tuple(position)
+
+    def line_height(self):
+        return 16.0
+
+    def em_width(self):
+        return 8.0
+
+    def show(self, x, show_surrounds=True):
+        pass
+
+    def show_at_center(self, x):
+        pass
+
+
+def _builtin_text_command(view, name, args):
+    # The few built-in commands the plugin runs itself
+    if name == "revert" and view.file_name():
+        with open(view.file_name(), encoding="utf-8", errors="replace") as f:
+            view._state.set_text(f.read())
+        view._state.dirty = False
+        view._state.change_count += 1
+    elif name == "save" and view.file_name():
+        with open(view.file_name(), "w", encoding="utf-8") as f:
+            f.write(view._state.text)
+        view._state.dirty = False
+        import sublime_plugin
+
+        sublime_plugin.on_event("on_post_save", view)
+    elif name == "goto_line":
+        point = view.text_point(int(args.get("line", 1)) - 1, 0)
+        view.sel().clear()
+        view.sel().add(Region(point))
+
+
+class _WindowState(object):
+    def __init__(self):
+        self.view_ids = []
+        self.active_view_id = None
+        self.panels = {}
+        self.project_data = None
+        # Queued answers for show_quick_panel (an index, -1 to cancel) and
+        # show_input_panel (a string, None to cancel)
+        self.quick_panel_answers = []
+        self.input_panel_answers = []
+        self.quick_panel_items = None
+
+
+class Window(object):
+    def __init__(self, window_id):
+        self.window_id = window_id
+
+    @property
+    def _state(self):
+        return _windows[self.window_id]
+
+    def __eq__(self, other):
+        return isinstance(other, Window) and other.window_id == self.window_id
+
+    def __hash__(self):
+        return self.window_id
+
+    def __repr__(self):
+        return "Window({0})".format(self.window_id)
+
+    def id(self):
+        return self.window_id
+
+    def is_valid(self):
+        return self.window_id in _windows
+
+    def views(self):
+        return [View(view_id) for view_id in self._state.view_ids]
+
+    def active_view(self):
+        view_id = self._state.active_view_id
+        if view_id is None or view_id not in self._state.view_ids:
+            return None
+        return View(view_id)
+
+    def focus_view(self, view):
+        import sublime_plugin
+
+        self._state.active_view_id = view.id()
+        sublime_plugin.on_event("on_activated", view)
+
+    def _add_view(self, file_name=None, text=""):
+        view_id = next(_ids)
+        _views[view_id] = _ViewState(self.window_id, file_name, text)
+        self._state.view_ids.append(view_id)
+        self._state.active_view_id = view_id
+        return View(view_id)
+
+    def new_file(self, flags=0, syntax=""):
+        import sublime_plugin
+
+        view = self._add_view()
+        view.set_syntax_file(syntax)
+        sublime_plugin.on_event("on_new", view)
+        sublime_plugin.on_event("on_activated", view)
+        return view
+
+    def find_open_file(self, file_name):
+        for view in self.views():
+            if view.file_name() == file_name:
+                return view
+        return None
+
+    def open_file(self, file_name, flags=0, group=-1):
+        import sublime_plugin
+
+        file_name = os.path.abspath(file_name)
+        view = self.find_open_file(file_name)
+        if view:
+            self.focus_view(view)
+            return view
+        try:
+            with open(file_name, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            text = ""
+        view = self._add_view(file_name, text)
+        sublime_plugin.on_event("on_load", view)
+        sublime_plugin.on_event("on_activated", view)
+        return view
+
+    def folders(self):
+        data = self._state.project_data or {}
+        return [folder["path"] for folder in data.get("folders", [])]
+
+    def project_data(self):
+        return self._state.project_data
+
+    def set_project_data(self, data):
+        self._state.project_data = data
+
+    def extract_variables(self):
+        variables = {"platform": platform().capitalize()}
+        folders = self.folders()
+        if folders:
+            variables["folder"] = folders[0]
+        view = self.active_view()
+        if view and view.file_name():
+            variables["file"] = view.file_name()
+            variables["file_path"] = os.path.dirname(view.file_name())
+            variables["file_name"] = os.path.basename(view.file_name())
+        return variables
+
+    def run_command(self, name, args=None):
+        import sublime_plugin
+
+        command_log.append((self, name, args))
+        sublime_plugin.run_window_command(self, name, args or {})
+
+    def get_output_panel(self, name):
+        return self.create_output_panel(name)
+
+    def create_output_panel(self, name, unlisted=False):
+        view_id = self._state.panels.get(name)
+        if view_id is None:
+            view_id = next(_ids)
+            _views[view_id] = _ViewState(self.window_id, panel=True)
+            self._state.panels[name] = view_id
+        return View(view_id)
+
+    def find_output_panel(self, name):
+        view_id = self._state.panels.get(name)
+        return View(view_id) if view_id else None
+
+    def show_quick_panel(
+        self, items, on_select, flags=0, selected_index=-1, on_highlight=None, **kwargs
+    ):
+        state = self._state
+        state.quick_panel_items = items
+        if state.quick_panel_answers:
+            answer = state.quick_panel_answers.pop(0)
+            set_timeout(lambda: on_select(answer), 0)
+
+    def show_input_panel(self, caption, initial_text, on_done, on_change, on_cancel):
+        state = self._state
+        if state.input_panel_answers:
+            answer = state.input_panel_answers.pop(0)
+            if answer is None:
+                if on_cancel:
+                    set_timeout(on_cancel, 0)
+            elif on_done:
+                set_timeout(lambda: on_done(answer), 0)
+        view_id = next(_ids)
+        _views[view_id] = _ViewState(self.window_id, text=initial_text, panel=True)
+        return View(view_id)
+
+
+def new_window():
+    global _active_window_id
+    window_id = next(_ids)
+    _windows[window_id] = _WindowState()
+    _active_window_id = window_id
+    return Window(window_id)
+
+
+def windows():
+    return [Window(window_id) for window_id in _windows]
+
+
+def active_window():
+    if _active_window_id not in _windows:
+        return new_window()
+    return Window(_active_window_id)
+
+
+def status_message(message):
+    status_messages.append(message)
+
+
+def error_message(message):
+    error_messages.append(message)
+    print("error_message:", message)
+
+
+def message_dialog(message):
+    status_messages.append(message)
+
+
+def ok_cancel_dialog(message, ok_title=""):
+    return dialog_answer
+
+
+def yes_no_cancel_dialog(message, yes_title="", no_title=""):
+    return 1 if dialog_answer else 0
+
+
+def set_clipboard(text):
+    global _clipboard
+    _clipboard = text
+
+
+def get_clipboard(size_limit=16777216):
+    return _clipboard
+
+
+def version():
+    return "4169"
+
+
+def platform():
+    if os.name == "nt":
+        return "windows"
+    return "osx" if os.uname().sysname == "Darwin" else "linux"
+
+
+def arch():
+    return "x64"
+
+
+def packages_path():
+    # Where the plugin is checked out, bench/fakes/ is two levels down
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(os.path.dirname(here)))
+
+
+def installed_packages_path():
+    return packages_path()
+
+
+def cache_path():
+    return os.path.join(packages_path(), "Cache")
+
+
+def score_selector(scope, selector):
+    return 0
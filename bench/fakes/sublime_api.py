@@ -0,0 +1,14 @@
+# The private API blame_all.py calls directly, on top of the fake views
+import sublime
+
+
+def view_add_phantom(view_id, key, region, content, layout, on_navigate):
+    return sublime.View(view_id).add_phantom(key, region, content, layout, on_navigate)
+
+
+def view_erase_phantoms(view_id, key):
+    sublime.View(view_id).erase_phantoms(key)
+
+
+def view_erase_phantom(view_id, phantom_id):
+    sublime.View(view_id).erase_phantom_by_id(phantom_id)
@@ -0,0 +1,163 @@
+# Command and event listener base classes for the fake sublime module.
+# Subclasses register themselves when they are defined, so importing the
+# plugin's modules is all it takes for view.run_command() and
+# window.run_command() to find them. Like the editor, one command instance
+# is kept per view or window, and event listeners are created on first use.
+import sublime
+
+text_command_classes = {}
+window_command_classes = {}
+application_command_classes = {}
+event_listener_classes = []
+view_event_listener_classes = []
+
+_commands = {}
+_event_listeners = {}
+_view_event_listeners = {}
+
+_BASES = (
+    "Command",
+    "ApplicationCommand",
+    "WindowCommand",
+    "TextCommand",
+    "EventListener",
+    "ViewEventListener",
+)
+
+
+def command_name(class_name):
+    # The editor's rule: GitShowAllCommand -> git_show_all
+    name = class_name[0].lower()
+    last_upper = False
+    for c in class_name[1:]:
+        if c.isupper() and not last_upper:
+            name += "_" + c.lower()
+        else:
+            name += c
+        last_upper = c.isupper()
+    if name.endswith("_command"):
+        name = name[: -len("_command")]
+    return name
+
+
+class Command(object):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__name__ in _BASES:
+            return
+        name = command_name(cls.__name__)
+        if issubclass(cls, TextCommand):
+            text_command_classes[name] = cls
+        elif issubclass(cls, WindowCommand):
+            window_command_classes[name] = cls
+        else:
+            application_command_classes[name] = cls
+
+    def name(self):
+        return command_name(type(self).__name__)
+
+    def is_enabled(self, *args, **kwargs):
+        return True
+
+    def is_visible(self, *args, **kwargs):
+        return True
+
+    def description(self, *args, **kwargs):
+        return None
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class WindowCommand(Command):
+    def __init__(self, window):
+        self.window = window
+
+
+class TextCommand(Command):
+    def __init__(self, view):
+        self.view = view
+
+
+class EventListener(object):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        event_listener_classes.append(cls)
+
+
+class ViewEventListener(object):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__name__ not in _BASES:
+            view_event_listener_classes.append(cls)
+
+    @classmethod
+    def is_applicable(cls, settings):
+        return True
+
+    @classmethod
+    def applies_to_primary_view_only(cls):
+        return True
+
+    def __init__(self, view):
+        self.view = view
+
+
+def _command(cls, target):
+    key = (cls, target)
+    command = _commands.get(key)
+    if command is None:
+        command = _commands[key] = cls(target)
+    return command
+
+
+def run_text_command(view, name, args):
+    # Returns whether the command exists, disabled ones don't run
+    cls = text_command_classes.get(name)
+    if cls is None:
+        return False
+    command = _command(cls, view)
+    if command.is_enabled(**args):
+        command.run(sublime.Edit(view.id()), **args)
+    return True
+
+
+def run_window_command(window, name, args):
+    cls = window_command_classes.get(name)
+    if cls is None:
+        return False
+    command = _command(cls, window)
+    if command.is_enabled(**args):
+        command.run(**args)
+    return True
+
+
+def _listeners_for(view):
+    listeners = []
+    for cls in event_listener_classes:
+        if cls not in _event_listeners:
+            _event_listeners[cls] = cls()
+        listeners.append((_event_listeners[cls], True))
+    for cls in view_event_listener_classes:
+        if cls.is_applicable(view.settings()):
+            key = (cls, view.id())
+            if key not in _view_event_listeners:
+                _view_event_listeners[key] = cls(view)
+            listeners.append((_view_event_listeners[key], False))
+    return listeners
+
+
+def on_event(event, view, *args):
+    # Calls the listeners for event now and schedules the _async variants on
+    # the loop, which stands in for the editor's worker thread
+    for listener, takes_view in _listeners_for(view):
+        call_args = (view,) + args if takes_view else args
+        handler = getattr(listener, event, None)
+        if handler:
+            handler(*call_args)
+        async_handler = getattr(listener, event + "_async", None)
+        if async_handler:
+            sublime.set_timeout_async(
+                lambda h=async_handler, a=call_args: h(*a), 0
+            )
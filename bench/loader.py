@@ -0,0 +1,44 @@
+# Imports the plugin outside of Sublime Text, with the fakes standing in for
+# the modules the editor provides.
+import importlib
+import importlib.util
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKES_DIR = os.path.join(BENCH_DIR, "fakes")
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+# The name Package Control installs the plugin under
+PACKAGE_NAME = "Git"
+
+if FAKES_DIR not in sys.path:
+    sys.path.insert(0, FAKES_DIR)
+
+
+def load_package():
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        os.path.join(PACKAGE_DIR, "__init__.py"),
+        submodule_search_locations=[PACKAGE_DIR],
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+def load(module: str):
+    load_package()
+    return importlib.import_module(PACKAGE_NAME + "." + module)
+
+
+def load_plugins():
+    # Imports every top-level module, which is what the editor does with a
+    # package, so all commands and event listeners get registered
+    load_package()
+    for entry in sorted(os.listdir(PACKAGE_DIR)):
+        name, extension = os.path.splitext(entry)
+        if extension == ".py" and name != "__init__":
+            load(name)
@@ -0,0 +1,149 @@
+# Profiles commands end to end, from run_command() through the git process
+# to the views and phantoms they produce, against a synthetic repository and
+# the fake editor in bench/fakes.
+#
+#   python3 bench/profile_commands.py blame_show_all git_status
+#   python3 bench/profile_commands.py git_log --repeat 5 --sort tottime --dump log.prof
+#
+# CommandThread and other worker threads get a profiler of their own, their
+# stats are merged into the report.
+import argparse
+import cProfile
+import os
+import pstats
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+import synthrepo
+from loader import load_plugins
+
+import sublime  # isort:skip, the fake one loader put on the path
+
+
+def blame_show_all(window: sublime.Window, view: sublime.View) -> None:
+    view.run_command("blame_show_all")
+
+
+def blame(window: sublime.Window, view: sublime.View) -> None:
+    view.sel().clear()
+    view.sel().add(sublime.Region(view.text_point(100, 0), view.text_point(140, 0)))
+    view.run_command("blame")
+
+
+def git_status(window: sublime.Window, view: sublime.View) -> None:
+    # Picks the first file, which shows its diff
+    window._state.quick_panel_answers.append(0)
+    window.run_command("git_status")
+
+
+def git_log(window: sublime.Window, view: sublime.View) -> None:
+    # Picks the most recent commit, which shows its details
+    window._state.quick_panel_answers.append(0)
+    view.run_command("git_log")
+
+
+def git_log_all(window: sublime.Window, view: sublime.View) -> None:
+    window._state.quick_panel_answers.append(0)
+    window.run_command("git_log_all")
+
+
+SCENARIOS: Dict[str, Callable[[sublime.Window, sublime.View], None]] = {
+    "blame_show_all": blame_show_all,
+    "blame": blame,
+    "git_status": git_status,
+    "git_log": git_log,
+    "git_log_all": git_log_all,
+}
+
+
+class ThreadProfiles(object):
+    # threading calls the hook as the first thing in every new thread, which
+    # swaps it for a profiler of the thread's own
+    def __init__(self):
+        self.profiles: List[cProfile.Profile] = []
+        self.lock = threading.Lock()
+
+    def hook(self, frame, event, arg) -> None:
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def __enter__(self) -> "ThreadProfiles":
+        threading.setprofile(self.hook)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        threading.setprofile(None)
+
+
+def run(
+    window: sublime.Window,
+    path: str,
+    scenario: Callable[[sublime.Window, sublime.View], None],
+    profile: cProfile.Profile,
+) -> float:
+    # Every run starts from a freshly opened file, so nothing is cached in
+    # command instances or view settings from the one before
+    for view in window.views():
+        view.close()
+    view = window.open_file(path)
+    sublime.run_until_idle()
+
+    start = time.perf_counter()
+    profile.enable()
+    scenario(window, view)
+    sublime.run_until_idle()
+    profile.disable()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile commands end to end")
+    parser.add_argument("scenarios", nargs="+", choices=sorted(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sort", default="cumulative")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--dump", default="", help="write the merged stats here")
+    parser.add_argument("--repo", default="", help="where to put the repository")
+    synthrepo.add_spec_arguments(parser)
+    arguments = parser.parse_args()
+
+    repo = synthrepo.ensure_repo(
+        synthrepo.spec_from_arguments(arguments), arguments.repo
+    )
+    load_plugins()
+    window = sublime.active_window()
+    window.set_project_data({"folders": [{"path": repo}]})
+    path = os.path.join(repo, synthrepo.HOT_FILE)
+
+    profile = cProfile.Profile()
+    with ThreadProfiles() as threads:
+        for name in arguments.scenarios:
+            times = [
+                run(window, path, SCENARIOS[name], profile)
+                for _ in range(arguments.repeat)
+            ]
+            print(
+                "{0}: median {1:.1f} ms over {2} runs".format(
+                    name, statistics.median(times) * 1000, len(times)
+                )
+            )
+    for message in sublime.error_messages:
+        print("error:", message, file=sys.stderr)
+
+    stats = pstats.Stats(profile)
+    for thread_profile in threads.profiles:
+        thread_profile.create_stats()
+        stats.add(thread_profile)
+    if arguments.dump:
+        stats.dump_stats(arguments.dump)
+    stats.sort_stats(arguments.sort).print_stats(arguments.limit)
+
+
+if __name__ == "__main__":
+    main()
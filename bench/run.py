@@ -0,0 +1,256 @@
+# Benchmarks the plugin's hot paths against a synthetic repository, headless.
+#
+#   python3 bench/run.py --output before.json
+#   python3 bench/run.py --compare before.json
+#
+# Results are JSON so runs can be kept and compared. Repository parameters
+# are the options of synthrepo.py, the repository is generated on first use.
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import synthrepo
+from loader import load
+
+import sublime  # isort:skip, the fake one loader put on the path
+
+
+class Benchmark(NamedTuple):
+    # How many lines, hunks, commits... one run goes through
+    items: int
+    function: Callable[[], object]
+
+
+def _git(repo: str, *args: str) -> str:
+    return subprocess.check_output(("git", "-C", repo) + args).decode()
+
+
+def _file_view(path: str) -> sublime.View:
+    # A fresh view, so nothing is left over from another benchmark
+    window = sublime.active_window()
+    view = window.find_open_file(path)
+    if view:
+        view.close()
+    return window.open_file(path)
+
+
+def spawn(repo: str) -> Benchmark:
+    process = load("process")
+    git = process.resolve_executable("git")
+    return Benchmark(1, lambda: process.git_output(git, ["rev-parse", "HEAD"], repo))
+
+
+def blame_parse_line(repo: str) -> Benchmark:
+    blame_all = load("blame_all")
+    path = os.path.join(repo, synthrepo.HOT_FILE)
+    command = blame_all.BlameShowAll(_file_view(path))
+    lines = command.get_blame_text(path).splitlines()
+    parse_line = blame_all.BlameShowAll.parse_line
+    return Benchmark(len(lines), lambda: [parse_line(l) for l in lines])
+
+
+def blame_parse_blame(repo: str) -> Benchmark:
+    blame_all = load("blame_all")
+    path = os.path.join(repo, synthrepo.HOT_FILE)
+    command = blame_all.BlameShowAll(_file_view(path))
+    text = command.get_blame_text(path)
+    root = os.path.realpath(repo)
+    return Benchmark(text.count("\n"), lambda: command.parse_blame(text, root))
+
+
+def blame_phantom_setter(repo: str) -> Benchmark:
+    blame_all = load("blame_all")
+    view = _file_view(os.path.join(repo, synthrepo.HOT_FILE))
+    command = blame_all.BlameShowAll(view)
+    command.run(None)
+    sublime.run_until_idle()
+    return Benchmark(len(command.raw_list_formatting), command.phantom_setter)
+
+
+def blame_highlight(repo: str) -> Benchmark:
+    blame_all = load("blame_all")
+    view = _file_view(os.path.join(repo, synthrepo.HOT_FILE))
+    command = blame_all.BlameShowAll(view)
+    command.run(None)
+    sublime.run_until_idle()
+    # Walks the highlight through the first commits, then switches it off
+    shas = [line[3] for line in command.raw_list_formatting if len(line) > 3][:20]
+    shas.append(shas[-1])
+
+    def walk():
+        for sha in shas:
+            command.highlight_this_commit(sha)
+
+    return Benchmark(len(shas), walk)
+
+
+def add_cull_diff(repo: str) -> Benchmark:
+    add = load("add")
+
+    class Culler(add.GitAddSelectedHunkCommand):
+        def run_command(self, command, callback=None, **kwargs):
+            self.patch = kwargs.get("stdin")
+
+    view = _file_view(os.path.join(repo, synthrepo.HOT_FILE))
+    view.sel().clear()
+    view.sel().add(sublime.Region(0, view.size()))
+    diff = _git(repo, "diff", "--no-color", "-U0", synthrepo.HOT_FILE)
+    command = Culler(view)
+    return Benchmark(diff.count("\n@@"), lambda: command.cull_diff(diff))
+
+
+def log_done(repo: str) -> Benchmark:
+    history = load("history")
+
+    class Log(history.GitLog):
+        def quick_panel(self, *args, **kwargs):
+            pass
+
+    output = _git(
+        repo,
+        "log",
+        "--no-color",
+        "--pretty=%s (%h)\a%an <%aE>\a%ad (%ar)",
+        "--date=local",
+        "--max-count=9000",
+    )
+    command = Log()
+    return Benchmark(output.count("\n"), lambda: command.log_done(output))
+
+
+def status_filter(repo: str) -> Benchmark:
+    status = load("status")
+
+    class Status(status.GitStatusCommand):
+        def show_status_list(self):
+            pass
+
+    output = _git(repo, "status", "--porcelain")
+    command = Status(None)
+    return Benchmark(output.count("\n"), lambda: command.status_done(output))
+
+
+BENCHMARKS = {
+    "process.git_output": spawn,
+    "BaseBlame.parse_line": blame_parse_line,
+    "BaseBlame.parse_blame": blame_parse_blame,
+    "BlameShowAll.phantom_setter": blame_phantom_setter,
+    "BlameShowAll.highlight_this_commit": blame_highlight,
+    "GitAddSelectedHunkCommand.cull_diff": add_cull_diff,
+    "GitLog.log_done": log_done,
+    "GitStatusCommand.status_done": status_filter,
+}
+
+
+def measure(function: Callable[[], object], repeat: int) -> List[float]:
+    function()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(benchmark: Benchmark, times: List[float]) -> Dict[str, float]:
+    median = statistics.median(times)
+    return {
+        "items": benchmark.items,
+        "runs": len(times),
+        "min_ms": min(times) * 1000,
+        "median_ms": median * 1000,
+        "mean_ms": statistics.mean(times) * 1000,
+        "max_ms": max(times) * 1000,
+        "per_item_us": median * 1e6 / max(1, benchmark.items),
+    }
+
+
+def environment() -> Dict[str, str]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "git": subprocess.check_output(["git", "--version"]).decode().strip(),
+        "commit": subprocess.run(
+            ["git", "-C", here, "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        .stdout.decode()
+        .strip(),
+    }
+
+
+def print_table(
+    results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]]
+) -> None:
+    header = "{0:<40}{1:>8}{2:>12}{3:>12}".format(
+        "benchmark", "items", "median ms", "per item µs"
+    )
+    if baseline:
+        header += "{0:>12}{1:>9}".format("before ms", "change")
+    print(header, file=sys.stderr)
+    for name, result in results.items():
+        line = "{0:<40}{1:>8}{2:>12.3f}{3:>12.3f}".format(
+            name, result["items"], result["median_ms"], result["per_item_us"]
+        )
+        before = (baseline or {}).get(name)
+        if before:
+            change = result["median_ms"] / before["median_ms"] - 1
+            line += "{0:>12.3f}{1:>+8.1f}%".format(before["median_ms"], change * 100)
+        print(line, file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the plugin's hot paths")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="*", default=[], help="name substrings")
+    parser.add_argument("--repo", default="", help="where to put the repository")
+    parser.add_argument("--output", default="", help="JSON file, default stdout")
+    parser.add_argument("--compare", default="", help="JSON file of an earlier run")
+    synthrepo.add_spec_arguments(parser)
+    arguments = parser.parse_args()
+
+    spec = synthrepo.spec_from_arguments(arguments)
+    repo = synthrepo.ensure_repo(spec, arguments.repo)
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if arguments.only and not any(only in name for only in arguments.only):
+            continue
+        benchmark = setup(repo)
+        results[name] = summarize(
+            benchmark, measure(benchmark.function, arguments.repeat)
+        )
+
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "repository": spec._asdict(),
+        "results": results,
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
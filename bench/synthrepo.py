@@ -0,0 +1,216 @@
+# Generates synthetic git repositories for the benchmarks. The whole history
+# is produced in memory from a seeded random generator and handed to
+# `git fast-import` in one go, so even deep histories take seconds and the
+# same parameters always give the same repository.
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, Iterator, List, NamedTuple
+
+# Written into .git last, so a half-generated repository is never reused
+MARKER = "sublit-bench.json"
+# Commit and author dates start here and advance an hour per commit
+EPOCH = 1500000000
+
+_WORDS = (
+    "alpha beta gamma delta epsilon zeta theta kappa lambda sigma omega "
+    "return self value index buffer region commit branch author result "
+    "if else for while def class import from with yield lambda none true"
+).split()
+
+
+class RepoSpec(NamedTuple):
+    files: int = 40
+    commits: int = 500
+    authors: int = 12
+    lines: int = 2000
+    line_length: int = 60
+    # Lines touched per changed file and files changed per commit
+    hunk_lines: int = 6
+    files_per_commit: int = 3
+    # Files left modified in the working tree, and untracked files
+    dirty: int = 20
+    hot_file_edits: int = 40
+    untracked: int = 20
+    seed: int = 1
+
+    def key(self) -> str:
+        encoded = json.dumps(self._asdict(), sort_keys=True).encode()
+        return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def _line(rng: random.Random, length: int) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def _author(index: int) -> str:
+    return "Author {0} <author{0}@example.com>".format(index)
+
+
+def _edit(rng: random.Random, lines: List[str], spec: RepoSpec) -> None:
+    # Replaces, inserts or deletes one block of lines somewhere in the file
+    start = rng.randrange(max(1, len(lines)))
+    count = rng.randint(1, spec.hunk_lines)
+    kind = rng.random()
+    new = [_line(rng, spec.line_length) for _ in range(count)]
+    if kind < 0.6 or len(lines) <= spec.hunk_lines:
+        lines[start : start + count] = new
+    elif kind < 0.8:
+        lines[start:start] = new
+    else:
+        del lines[start : start + count]
+
+
+def _data(payload: bytes) -> bytes:
+    return b"data %d\n" % len(payload) + payload + b"\n"
+
+
+def path_of(index: int) -> str:
+    return "src/module_{0:03d}/file_{1:04d}.py".format(index % 16, index)
+
+
+# The file the per-file benchmarks (blame, diff) work on
+HOT_FILE = path_of(0)
+
+
+def fast_import_stream(
+    spec: RepoSpec, rng: random.Random, files: Dict[str, List[str]]
+) -> Iterator[bytes]:
+    paths = sorted(files)
+    for number in range(1, spec.commits + 1):
+        timestamp = EPOCH + number * 3600
+        author = _author(rng.randrange(spec.authors)).encode()
+        if number == 1:
+            changed = paths
+        else:
+            changed = rng.sample(paths, min(spec.files_per_commit, len(paths)))
+            for path in changed:
+                _edit(rng, files[path], spec)
+        message = "Change {0}: {1}".format(number, _line(rng, 40)).encode()
+        chunk = [
+            b"commit refs/heads/main\n",
+            b"mark :%d\n" % number,
+            b"author %s %d +0000\n" % (author, timestamp),
+            b"committer %s %d +0000\n" % (author, timestamp),
+            _data(message),
+        ]
+        if number > 1:
+            chunk.append(b"from :%d\n" % (number - 1))
+        for path in changed:
+            content = ("\n".join(files[path]) + "\n").encode()
+            chunk.append(b"M 100644 inline %s\n" % path.encode())
+            chunk.append(_data(content))
+        chunk.append(b"\n")
+        yield b"".join(chunk)
+
+
+def _git(repo: str, *args: str, **kwargs) -> bytes:
+    return subprocess.check_output(("git", "-C", repo) + args, **kwargs)
+
+
+def generate(spec: RepoSpec, directory: str) -> None:
+    # Only a repository this script generated is ever deleted, whatever
+    # --repo points at
+    if os.path.isfile(os.path.join(directory, ".git", MARKER)):
+        shutil.rmtree(directory)
+    elif os.path.exists(directory) and (
+        not os.path.isdir(directory) or os.listdir(directory)
+    ):
+        raise FileExistsError(
+            "{0} exists and wasn't generated by synthrepo.py, not touching "
+            "it".format(directory)
+        )
+    os.makedirs(directory, exist_ok=True)
+    subprocess.check_call(["git", "init", "-q", directory])
+    _git(directory, "symbolic-ref", "HEAD", "refs/heads/main")
+    _git(directory, "config", "user.name", "Bench")
+    _git(directory, "config", "user.email", "bench@example.com")
+
+    rng = random.Random(spec.seed)
+    files = {
+        path_of(index): [_line(rng, spec.line_length) for _ in range(spec.lines)]
+        for index in range(spec.files)
+    }
+    # Delta compression would dominate the generation time and the benchmarks
+    # aren't about git's object storage
+    importer = subprocess.Popen(
+        [
+            "git",
+            "-C",
+            directory,
+            "-c",
+            "core.compression=1",
+            "fast-import",
+            "--quiet",
+            "--big-file-threshold=1k",
+        ],
+        stdin=subprocess.PIPE,
+    )
+    for chunk in fast_import_stream(spec, rng, files):
+        importer.stdin.write(chunk)
+    importer.stdin.close()
+    if importer.wait():
+        raise RuntimeError("git fast-import failed")
+    _git(directory, "reset", "-q", "--hard", "main")
+
+    # The hot file is always dirty, with many more hunks than the others
+    for path in sorted(files)[: max(1, spec.dirty)]:
+        lines = files[path]
+        for _ in range(spec.hot_file_edits if path == HOT_FILE else 4):
+            _edit(rng, lines, spec)
+        with open(os.path.join(directory, path), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    for index in range(spec.untracked):
+        name = "untracked_{0}.txt".format(index)
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(_line(rng, spec.line_length) + "\n")
+
+    with open(os.path.join(directory, ".git", MARKER), "w") as f:
+        json.dump(spec._asdict(), f, sort_keys=True)
+
+
+def ensure_repo(spec: RepoSpec, directory: str = "") -> str:
+    # Generating is deterministic, so a repository made earlier from the same
+    # spec is reused as is
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(), "sublit-bench-" + spec.key())
+    try:
+        with open(os.path.join(directory, ".git", MARKER)) as f:
+            if json.load(f) == spec._asdict():
+                return directory
+    except (OSError, ValueError):
+        pass
+    generate(spec, directory)
+    return directory
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    for field, default in RepoSpec._field_defaults.items():
+        parser.add_argument(
+            "--" + field.replace("_", "-"), type=int, default=default, dest=field
+        )
+
+
+def spec_from_arguments(arguments: argparse.Namespace) -> RepoSpec:
+    return RepoSpec(
+        **{field: getattr(arguments, field) for field in RepoSpec._fields}
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic repository")
+    parser.add_argument("directory", nargs="?", default="")
+    add_spec_arguments(parser)
+    arguments = parser.parse_args()
+    print(ensure_repo(spec_from_arguments(arguments), arguments.directory))
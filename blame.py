@@ -1,21 +1,35 @@
+import os
+import threading
+from typing import Dict, List
 from urllib.parse import quote_plus
 
 import sublime
 import sublime_plugin
 
+from . import git_binary, git_root
 from .base import BaseBlame
-from .templates import blame_phantom_css, blame_phantom_html_template
+from .linehistory import LineCommit, line_history, line_origin
+from .settings import PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS, pkg_settings
+from .templates import (
+    blame_next_link_template,
+    blame_phantom_css,
+    blame_phantom_html_template,
+)
 
 
 class Blame(BaseBlame, sublime_plugin.TextCommand):
+    blame_kind = "line"
 
     # Overrides (TextCommand) ----------------------------------------------------------
 
     def __init__(self, view):
         super().__init__(view)
         self.phantom_set = sublime.PhantomSet(view, self.phantom_set_key())
+        # Row -> history of the line, while the view is unchanged
+        self.histories: Dict[int, List[LineCommit]] = {}
+        self.histories_change_count = -1
 
-    def run(self, edit, prevving=False, fixed_row_num=None, sha_skip_list=[]):
+    def run(self, edit, prevving=False, fixed_row_num=None, history_index=0):
         if not self.has_suitable_view():
             self.tell_user_to_save()
             return
@@ -48,10 +62,34 @@ class Blame(BaseBlame, sublime_plugin.TextCommand):
 
             full_path = self.view.file_name()
 
-            try:
-                blame_output = self.get_blame_text(
-                    full_path, line_num=line_num, sha_skip_list=sha_skip_list
+            if prevving:
+                try:
+                    history = self.line_history(full_path, row_num)
+                except Exception as e:
+                    self.communicate_error(e)
+                    return
+                if history_index >= len(history):
+                    sublime.message_dialog(
+                        "No earlier commits affected line {0}".format(line_num)
+                    )
+                    return
+                commit = history[history_index]
+                phantoms.append(
+                    self.blame_phantom(
+                        line_region,
+                        row_num,
+                        commit.short_sha,
+                        commit.sha,
+                        commit.author,
+                        commit.date,
+                        commit.time,
+                        history_index,
+                    )
                 )
+                continue
+
+            try:
+                blame_output = self.get_blame_text(full_path, line_num=line_num)
             except Exception as e:
                 self.communicate_error(e)
                 return
@@ -64,46 +102,23 @@ class Blame(BaseBlame, sublime_plugin.TextCommand):
                     )
                 )
                 return
-            sha = blame["sha"]
-            sha_normalised = blame["sha_normalised"]
-            author = blame["author"]
-            date = blame["date"]
-            time = blame["time"]
-
-            if sha_skip_list:
-                recently_skipped_sha = sha_skip_list[-1]
-                if sha_normalised == recently_skipped_sha:
-                    sublime.message_dialog(
-                        "No earlier commits affected line {0}".format(line_num)
-                    )
-                    return
-
-            phantoms.append(
-                sublime.Phantom(
-                    line_region,
-                    blame_phantom_html_template.format(
-                        css=blame_phantom_css,
-                        sha=sha,
-                        sha_not_latest_indicator=" *" if sha_skip_list else "",
-                        author=author,
-                        date=date,
-                        time=time,
-                        qs_row_num_val=quote_plus(str(row_num)),
-                        qs_sha_val=quote_plus(sha_normalised),
-                        # Querystrings can contain the same key multiple times. We use that
-                        # functionality to accumulate a list of SHAs to skip over when
-                        # a [Prev] button has been clicked multiple times.
-                        qs_skip_keyvals="&amp;".join(
-                            [
-                                "skip={0}".format(quote_plus(skipee))
-                                for skipee in sha_skip_list
-                            ]
-                        ),
-                    ),
-                    sublime.LAYOUT_BLOCK,
-                    self.handle_phantom_button,
-                )
+            phantom = self.blame_phantom(
+                line_region,
+                row_num,
+                blame["sha"],
+                blame["sha_normalised"],
+                blame["author"],
+                blame["date"],
+                blame["time"],
+                0,
             )
+            phantoms.append(phantom)
+            if self.upgrade_budget() is not None:
+                threading.Thread(
+                    target=self.upgrade_in_background,
+                    args=(phantom, row_num, self.view.change_count()),
+                    daemon=True,
+                ).start()
 
         self.phantom_set.update(phantoms)
 
@@ -115,11 +130,8 @@ class Blame(BaseBlame, sublime_plugin.TextCommand):
     def close_by_user_request(self):
         self.phantom_set.update([])
 
-    def extra_cli_args(self, line_num, sha_skip_list):
-        args = ["-L", "{0},{0}".format(line_num)]
-        for skipped_sha in sha_skip_list:
-            args.extend(["--ignore-rev", skipped_sha])
-        return args
+    def extra_cli_args(self, line_num):
+        return ["-L", "{0},{0}".format(line_num)]
 
     def rerun(self, **kwargs):
         self.run(None, **kwargs)
@@ -129,6 +141,91 @@ class Blame(BaseBlame, sublime_plugin.TextCommand):
     def phantom_exists_for_region(self, region):
         return any(p.region == region for p in self.phantom_set.phantoms)
 
+    def blame_phantom(
+        self, line_region, row_num, sha, sha_normalised, author, date, time, index
+    ):
+        qs_row_num_val = quote_plus(str(row_num))
+        next_link = ""
+        if index:
+            next_link = blame_next_link_template.format(
+                qs_row_num_val=qs_row_num_val, qs_index_val=index
+            )
+        return sublime.Phantom(
+            line_region,
+            blame_phantom_html_template.format(
+                css=blame_phantom_css,
+                sha=sha,
+                sha_not_latest_indicator=" *" if index else "",
+                author=author,
+                date=date,
+                time=time,
+                qs_row_num_val=qs_row_num_val,
+                qs_sha_val=quote_plus(sha_normalised),
+                qs_index_val=index,
+                next_link=next_link,
+            ),
+            sublime.LAYOUT_BLOCK,
+            self.handle_phantom_button,
+        )
+
+    def upgrade_in_background(self, quick, row_num, change_count):
+        try:
+            blame_output = self.get_blame_text(
+                self.view.file_name(), upgraded=True, line_num=row_num + 1
+            )
+        except Exception:
+            # Over budget or failed, the quick blame stays
+            return
+        blame = self.parse_line(blame_output)
+        if not blame:
+            return
+        phantom = self.blame_phantom(
+            quick.region,
+            row_num,
+            blame["sha"],
+            blame["sha_normalised"],
+            blame["author"],
+            blame["date"],
+            blame["time"],
+            0,
+        )
+        sublime.set_timeout(lambda: self.apply_upgrade(quick, phantom, change_count))
+
+    def apply_upgrade(self, quick, phantom, change_count):
+        # Only if the quick phantom is still shown, [Prev] may have replaced it
+        if self.view.change_count() != change_count:
+            return
+        phantoms = list(self.phantom_set.phantoms)
+        for index, shown in enumerate(phantoms):
+            if shown.region == quick.region and shown.content == quick.content:
+                phantoms[index] = phantom
+                self.phantom_set.update(phantoms)
+                return
+
+    def line_history(self, path: str, row_num: int) -> List[LineCommit]:
+        # The commits that changed a line, newest first. Looked up once per
+        # line, [Prev] and [Next] then only move through the list.
+        if self.histories_change_count != self.view.change_count():
+            self.histories = {}
+            self.histories_change_count = self.view.change_count()
+        history = self.histories.get(row_num)
+        if history is None:
+            git = git_binary()
+            root = git_root(os.path.dirname(os.path.realpath(path)))
+            caller = type(self).__name__
+            origin = line_origin(
+                git,
+                root,
+                os.path.relpath(os.path.realpath(path), root),
+                row_num + 1,
+                pkg_settings().get(PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS, []),
+                caller=caller,
+            )
+            history = self.histories[row_num] = (
+                line_history(git, root, *origin, caller=caller) if origin else []
+            )
+        return history
+
 
 class BlameInsertCommitDescription(sublime_plugin.TextCommand):
 
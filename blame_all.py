@@ -1,12 +1,23 @@
+import os
+import threading
+from array import array
 from enum import IntEnum
-from typing import List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import sublime
 import sublime_plugin
 from sublime import LAYOUT_INLINE, Edit, Region, View
-from sublime_api import view_add_phantom, view_erase_phantoms
+from sublime_api import view_add_phantom, view_erase_phantom, view_erase_phantoms
 
+from . import git_binary, git_root
 from .base import BaseBlame
+from .commits import cached_message, fetch_messages
+from .templates import (
+    blame_all_phantom_color_rule,
+    blame_all_phantom_css,
+    blame_all_phantom_html_template,
+    blame_all_phantom_text_rule,
+)
 
 
 class Dim(IntEnum):
@@ -32,6 +43,9 @@ VIEW_SETTINGS_KEY_WRAP_PREV = "word_wrap_prev"  # Made up by us
 VIEW_SETTINGS_KEY_INDENT_GUIDE = "draw_indent_guides"  # Made up by us
 VIEW_SETTINGS_KEY_INDENT_GUIDE_PREV = "draw_indent_guides_prev"  # Made up by us
 
+PROGRESS_STATUS_KEY = "git-blame-all-progress"
+PROGRESS_INTERVAL_MS = 200
+
 color_list = [
     "redish",
     "orangish",
@@ -43,6 +57,55 @@ color_list = [
     "pinkish",
 ]
 
+# The dim levels hunk_html uses for the border of commits, of uncommitted
+# lines and for the text
+COMMIT_DIMS = ("10", "40", "100")
+NOT_COMMITTED_DIMS = ("10", "40", "70")
+TEXT_DIMS = ("10", "25", "70")
+
+# Class -> its rule. minihtml has no stylesheet shared between phantoms, so
+# each one only carries the rules of the two classes it uses.
+phantom_rules: Dict[str, str] = {}
+for color, dims in [(color, COMMIT_DIMS) for color in color_list] + [
+    ("foreground", NOT_COMMITTED_DIMS)
+]:
+    for dim in dims:
+        phantom_rules["{0}-{1}".format(color, dim)] = (
+            blame_all_phantom_color_rule.format(color=color, dim=dim)
+        )
+for dim in TEXT_DIMS:
+    phantom_rules["text-" + dim] = blame_all_phantom_text_rule.format(dim=dim)
+
+
+class LineBlame(object):
+    # The commit of every line shown by blame-all. Each distinct SHA is kept
+    # once, lines only hold an index into that table.
+    __slots__ = ("commits", "lines", "full_shas")
+
+    def __init__(self, shas: List[str]):
+        indexes: Dict[str, int] = {}
+        self.commits: List[str] = []
+        self.lines = array("I")
+        # Abbreviated SHA as shown by blame -> full SHA, filled in as the
+        # commit messages are fetched
+        self.full_shas: Dict[str, str] = {}
+        for sha in shas:
+            index = indexes.get(sha)
+            if index is None:
+                index = indexes[sha] = len(self.commits)
+                self.commits.append(sha)
+            self.lines.append(index)
+
+    def sha(self, row: int) -> Optional[str]:
+        if 0 <= row < len(self.lines):
+            return self.commits[self.lines[row]]
+        return None
+
+
+# View id -> LineBlame. Kept out of the view settings, which are serialized
+# into the session on every change.
+line_blames: Dict[int, LineBlame] = {}
+
 
 class BlameWatcher(BaseBlame, sublime_plugin.ViewEventListener):
     def _view(self) -> View:
@@ -58,10 +121,9 @@ class BlameWatcher(BaseBlame, sublime_plugin.ViewEventListener):
         self.run(None)
 
     def on_modified(self):
-        if not self.view.settings().get("shas"):
+        if line_blames.pop(self.view.id(), None) is None:
             return
 
-        self.view.settings().erase("shas")
         view_erase_phantoms(self.view.id(), "blame_all")
         self.view.settings().set(
             VIEW_SETTINGS_KEY_RULERS,
@@ -76,6 +138,9 @@ class BlameWatcher(BaseBlame, sublime_plugin.ViewEventListener):
             self.view.settings().get(VIEW_SETTINGS_KEY_WRAP_PREV),
         )
 
+    def on_close(self):
+        line_blames.pop(self.view.id(), None)
+
     def on_hover(self, point: int, hover_zone: int) -> None:
         if not self.view.settings().get(VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED):
             return
@@ -90,28 +155,60 @@ class BlameWatcher(BaseBlame, sublime_plugin.ViewEventListener):
         if col != 0:
             return
 
-        shas = self.view.settings().get("shas", [])
-        if not shas:
+        line_blame = line_blames.get(self.view.id())
+        sha = line_blame.sha(point_to_line) if line_blame else None
+        if not sha:
             return
-        sha: str = shas[point_to_line]
         if sha == len(sha) * "0":
-            self.view.show_popup(
-                '<body style="padding: 4px; margin: 0; font-family: system-ui;"><div>Not committed yet</div></body>',
-                location=point,
-                flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+            self.show_text_popup("Not committed yet", point)
+            return
+
+        # Messages are normally prefetched when blame-all is shown, git is
+        # never run on the UI thread
+        full_sha = line_blame.full_shas.get(sha.strip("^"))
+        message = cached_message(full_sha) if full_sha else None
+        if message is None:
+            sublime.set_timeout_async(
+                lambda: self.fetch_commit_popup(line_blame, sha, point, file_name)
             )
             return
+        self.show_commit_popup(full_sha, message, point)
 
+    def fetch_commit_popup(
+        self, line_blame: "LineBlame", sha: str, point: int, file_name: str
+    ) -> None:
         try:
-            raw_desc = self.get_commit_desc(sha, file_name)
-            elems: List[str] = raw_desc.rstrip().split("\n", 1)
-            commmit_id = elems[0][7:]
-            desc: str = elems[1].replace("\n", "<br>")
-            popup_text = f'<body style="padding: 4px; margin: 0; font-family: system-ui;"><a href="copy?sha={commmit_id}">{commmit_id}</a><div>{desc}</div></body>'
+            line_blame.full_shas.update(
+                fetch_messages(
+                    git_binary(),
+                    git_root(os.path.dirname(os.path.realpath(file_name))),
+                    [sha],
+                    caller=type(self).__name__,
+                )
+            )
         except Exception as e:
             self.communicate_error(e)
             return
+        full_sha = line_blame.full_shas.get(sha.strip("^"))
+        message = cached_message(full_sha) if full_sha else None
+        if message is None:
+            # git failed just now or lately, see fetch_messages
+            sublime.set_timeout(
+                lambda: self.show_text_popup("Commit message unavailable", point)
+            )
+            return
+        sublime.set_timeout(lambda: self.show_commit_popup(full_sha, message, point))
 
+    def show_text_popup(self, text: str, point: int) -> None:
+        self.view.show_popup(
+            f'<body style="padding: 4px; margin: 0; font-family: system-ui;"><div>{text}</div></body>',
+            location=point,
+            flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+        )
+
+    def show_commit_popup(self, commmit_id: str, message: str, point: int) -> None:
+        desc: str = message.replace("\n", "<br>")
+        popup_text = f'<body style="padding: 4px; margin: 0; font-family: system-ui;"><a href="copy?sha={commmit_id}">{commmit_id}</a><div>{desc}</div></body>'
         self.view.show_popup(
             popup_text,
             location=point,
@@ -123,6 +220,7 @@ class BlameWatcher(BaseBlame, sublime_plugin.ViewEventListener):
 
 class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
     HORIZONTAL_SCROLL_DELAY_MS = 100
+    blame_kind = "all"
 
     # Overrides (TextCommand) ----------------------------------------------------------
     def __init__(self, view: View):
@@ -138,6 +236,19 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
         self.actual_author_max_len: int = 0
         self.sha_length: int = 0
         self.highlighted_commit = ""
+        # (sha, color dim, text dim) -> phantom HTML, text dim is None for the
+        # lines after the first of a hunk
+        self.html_cache: Dict[Tuple[str, str, Optional[str]], str] = {}
+        self.line_regions: List[Region] = []
+        # Index of the first line of each hunk, and the hunks of each commit
+        self.hunk_starts: List[int] = []
+        self.hunks_by_sha: Dict[str, List[int]] = {}
+        # Id of the phantom currently shown for each line
+        self.phantom_ids: List[int] = []
+        self.space_string: str = ""
+        # Bumped for every blame started, results of older ones are dropped
+        self.generation = 0
+        self.pending = 0
 
     def highlight_this_commit(self, href: str) -> None:
         if not self.raw_list_formatting:
@@ -150,12 +261,21 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
             self.horizontal_scroll_to_limit(left=True)
             return
 
-        if href == self.highlighted_commit:
-            self.phantom_setter()
-            self.highlighted_commit = ""
+        previous = self.highlighted_commit
+        self.highlighted_commit = "" if href == previous else href
+        if len(self.phantom_ids) != len(self.regs_ready_formatting):
+            self.phantom_setter(self.highlighted_commit or None)
+            return
+        # Going from one highlighted commit to another only changes the hunks
+        # of those two, otherwise every hunk is dimmed or undimmed
+        if previous and self.highlighted_commit:
+            hunks = sorted(
+                self.hunks_by_sha.get(previous, [])
+                + self.hunks_by_sha.get(self.highlighted_commit, [])
+            )
         else:
-            self.phantom_setter(href)
-            self.highlighted_commit = href
+            hunks = range(len(self.hunk_starts))
+        self.update_hunks(hunks, self.highlighted_commit or None)
 
     def format_author(self, author: str) -> str:
         if len(author) > self.actual_author_max_len:
@@ -164,101 +284,146 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
             ret_str: str = author
         return ret_str + "&nbsp;" * (self.actual_author_max_len - len(author))
 
-    def region_creator(
+    def phantom_html(
         self,
-        line_number: int,
         sha_color: str,
         sha: str,
-        author: str,
-        date: str,
+        text: str,
         sha_dim: str,
-        text_dim: str,
-    ) -> Tuple[Region, str]:
-        return (
-            Region(self.view.text_point(line_number - 1, 0)),
-            f"""<body style="padding: 0px 6px 4px 0; margin: 0; border-right: 5px solid color(var(--{sha_color}) blend(var(--background) {sha_dim}%)));"><a style="text-decoration:none;" href="{sha}"><span style="color: color(var(--foreground) blend(var(--background){text_dim}%));" class="message">{sha}&nbsp;&nbsp;{author}&nbsp;&nbsp;{date}</span></a></body>""",
-        )
+        text_dim: Optional[str],
+    ) -> str:
+        key = (sha, sha_dim, text_dim)
+        html = self.html_cache.get(key)
+        if html is None:
+            color_class = "{0}-{1}".format(sha_color, sha_dim)
+            text_class = "text-" + text_dim if text_dim else ""
+            css = blame_all_phantom_css.format(
+                rules=phantom_rules[color_class] + phantom_rules.get(text_class, "")
+            )
+            html = self.html_cache[key] = blame_all_phantom_html_template.format(
+                classes=color_class,
+                css=css,
+                sha=sha,
+                text_classes=("message " + text_class).rstrip(),
+                text=text,
+            )
+        return html
+
+    def hunk_html(self, head, hl_sha: Union[str, None]) -> Tuple[str, str]:
+        # The HTML of the first line of a hunk and of the lines after it
+        if head[0] == HunkType.NOT_COMMITTED:
+            sha_color: str = "foreground"
+            sha = "0" * self.sha_length
+            author: str = "Not committed yet"
+            date: str = "0000-00-00"
+            if hl_sha is not None:
+                if sha == hl_sha:
+                    color_dim = "70"
+                    text_dim = "70"
+                else:
+                    color_dim = "10"
+                    text_dim = "10"
+            else:
+                color_dim: str = "40"
+                text_dim = "25"
+        elif head[0] == HunkType.NEW_HUNK:
+            sha_color: str = head[2]
+            sha: str = head[3]
+            author: str = head[4]
+            date: str = head[5]
+            if hl_sha is not None:
+                if sha == hl_sha:
+                    color_dim = "100"
+                    text_dim = "70"
+                else:
+                    color_dim = "10"
+                    text_dim = "10"
+            else:
+                color_dim: str = "40" if head[6] else "100"
+                text_dim = "25"
+        else:
+            raise Exception("Invalid HunkType")
+
+        first = self.html_cache.get((sha, color_dim, text_dim))
+        if first is None:
+            text = f"{sha}&nbsp;&nbsp;{self.format_author(author)}&nbsp;&nbsp;{date}"
+            first = self.phantom_html(sha_color, sha, text, color_dim, text_dim)
+        rest = self.phantom_html(sha_color, sha, self.space_string, color_dim, None)
+        return first, rest
+
+    def hunk_lines(self, hunk: int) -> range:
+        starts = self.hunk_starts
+        end = starts[hunk + 1] if hunk + 1 < len(starts) else len(self.line_regions)
+        return range(starts[hunk], end)
 
     def phantom_setter(self, hl_sha: Union[str, None] = None) -> None:
         if self.actual_author_max_len > self.max_author_len:
             self.actual_author_max_len = self.max_author_len
-        space_string: str = (
+        self.space_string = (
             self.actual_author_max_len + 14 + self.sha_length
         ) * "&nbsp;"
 
+        # The lines don't move while blame is shown, highlighting a commit
+        # only changes the HTML
+        if len(self.line_regions) != len(self.raw_list_formatting):
+            self.line_regions = [
+                Region(self.view.text_point(line[1] - 1, 0))
+                for line in self.raw_list_formatting
+            ]
+            self.hunk_starts = []
+            self.hunks_by_sha = {}
+            for index, line in enumerate(self.raw_list_formatting):
+                if line[0] == HunkType.SAME_AS_PREV_LINE:
+                    continue
+                sha = line[3] if line[0] == HunkType.NEW_HUNK else "0" * self.sha_length
+                self.hunks_by_sha.setdefault(sha, []).append(len(self.hunk_starts))
+                self.hunk_starts.append(index)
+
         self.regs_ready_formatting = []
-        sha_color: str = ""
-        sha: str = ""
-        author: str = ""
-        date: str = ""
-        color_dim: str = ""
-        for line in self.raw_list_formatting:
-            line_number: int = line[1]
-
-            if line[0] == HunkType.SAME_AS_PREV_LINE:
-                self.regs_ready_formatting.append(
-                    (
-                        Region(self.view.text_point(line_number - 1, 0)),
-                        f'<body style="padding: 0px 6px 4px 0; margin: 0; border-right: 5px solid color(var(--{sha_color}) blend(var(--background) {color_dim}%)));"> <a style="text-decoration:none;" href="{sha}"><span class="message">{space_string}</span></a></body>',
-                    )
-                )
-            elif line[0] == HunkType.NOT_COMMITTED:
-                sha_color: str = "foreground"
-                sha = "0" * self.sha_length
-                author: str = self.format_author("Not committed yet")
-                date: str = "0000-00-00"
-                if hl_sha is not None:
-                    if sha == hl_sha:
-                        color_dim = "70"
-                        text_dim = "70"
-                    else:
-                        color_dim = "10"
-                        text_dim = "10"
-                else:
-                    color_dim: str = "40"
-                    text_dim = "25"
-                self.regs_ready_formatting.append(
-                    self.region_creator(
-                        line_number, sha_color, sha, author, date, color_dim, text_dim
-                    )
-                )
-            elif line[0] == HunkType.NEW_HUNK:
-                sha_color: str = line[2]
-                sha: str = line[3]
-                author: str = self.format_author(line[4])
-                date: str = line[5]
-                if hl_sha is not None:
-                    if sha == hl_sha:
-                        color_dim = "100"
-                        text_dim = "70"
-                    else:
-                        color_dim = "10"
-                        text_dim = "10"
-                else:
-                    color_dim: str = "40" if line[6] else "100"
-                    text_dim = "25"
-                self.regs_ready_formatting.append(
-                    self.region_creator(
-                        line_number, sha_color, sha, author, date, color_dim, text_dim
-                    )
-                )
-            else:
-                raise Exception("Invalid HunkType")
+        for hunk, start in enumerate(self.hunk_starts):
+            first, rest = self.hunk_html(self.raw_list_formatting[start], hl_sha)
+            for index in self.hunk_lines(hunk):
+                html = first if index == start else rest
+                self.regs_ready_formatting.append((self.line_regions[index], html))
 
         self.set_phantoms_from_regions()
 
+    def update_hunks(self, hunks, hl_sha: Union[str, None]) -> None:
+        # Replaces only the phantoms whose HTML changes
+        buffer_id = self.view.id()
+        for hunk in hunks:
+            start = self.hunk_starts[hunk]
+            first, rest = self.hunk_html(self.raw_list_formatting[start], hl_sha)
+            for index in self.hunk_lines(hunk):
+                html = first if index == start else rest
+                region, current = self.regs_ready_formatting[index]
+                if html == current:
+                    continue
+                view_erase_phantom(buffer_id, self.phantom_ids[index])
+                self.phantom_ids[index] = view_add_phantom(
+                    buffer_id,
+                    self.key_name,
+                    region,
+                    html,
+                    LAYOUT_INLINE,
+                    self.highlight_this_commit,
+                )
+                self.regs_ready_formatting[index] = (region, html)
+
     def set_phantoms_from_regions(self) -> None:
         buffer_id = self.view.id()
         self.view.erase_phantoms(self.key_name)
-        for line in self.regs_ready_formatting:
+        self.phantom_ids = [
             view_add_phantom(
                 buffer_id,
                 self.key_name,
-                line[0],
-                line[1],
+                region,
+                html,
                 LAYOUT_INLINE,
                 self.highlight_this_commit,
             )
+            for region, html in self.regs_ready_formatting
+        ]
 
     def run(self, edit: Edit):
         if not self.has_suitable_view():
@@ -271,6 +436,10 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
 
         view_erase_phantoms(self.view.id(), self.key_name)
 
+        # Running it again while blame is still being computed cancels it
+        if self.cancel_pending():
+            return
+
         # If they are currently shown, toggle them off and return.
         if self.view.settings().get(VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED, False):
             self.view.hide_popup()
@@ -281,7 +450,7 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
             self.horizontal_scroll_to_limit(left=True)
             return
 
-        if self.regs_ready_formatting and self.view.settings().get("shas", False):
+        if self.regs_ready_formatting and self.view.id() in line_blames:
             self.view.settings().set(VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED, True)
             self.settings_for_blame()
             # Bring the phantoms into view without the user needing to manually scroll left.
@@ -290,42 +459,118 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
             self.set_phantoms_from_regions()
             return
 
+        # Blame runs and is parsed on the worker thread, the phantoms are
+        # only added if the view hasn't changed in the meantime
+        self.generation += 1
+        self.pending = self.generation
+        generation = self.generation
+        change_count = self.view.change_count()
+        self.show_progress(generation)
+        sublime.set_timeout_async(
+            lambda: self.blame_in_background(file_name, generation, change_count)
+        )
+
+    def cancel_pending(self) -> bool:
+        # Returns whether there was a blame in flight
+        if not self.pending:
+            return False
+        self.pending = 0
+        self.view.erase_status(PROGRESS_STATUS_KEY)
+        return True
+
+    def show_progress(self, generation: int, step: int = 0) -> None:
+        if self.pending != generation:
+            return
+        dots = "." * (step % 3 + 1)
+        self.view.set_status(PROGRESS_STATUS_KEY, f"Git blame: running{dots}")
+        sublime.set_timeout(
+            lambda: self.show_progress(generation, step + 1), PROGRESS_INTERVAL_MS
+        )
+
+    def blame_in_background(
+        self, file_name: str, generation: int, change_count: int
+    ) -> None:
+        if self.pending != generation:
+            return
+        # Nothing to upgrade to if the thorough blame is cached already
+        upgrade = self.upgrade_budget() is not None
+        blame_output = None
+        if upgrade:
+            blame_output = self.cached_full_blame_text(file_name, upgraded=True)
+            upgrade = blame_output is None
         try:
-            blame_output = self.get_blame_text(file_name)
+            if blame_output is None:
+                blame_output = self.get_full_blame_text(file_name)
         except Exception as e:
-            self.communicate_error(e)
+            # Bound now, e is gone once the except block ends
+            sublime.set_timeout(lambda e=e: self.blame_failed(generation, e))
             return
 
-        self.view.settings().set(VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED, True)
-        self.settings_for_blame()
-        # Bring the phantoms into view without the user needing to manually scroll left.
-        self.horizontal_scroll_to_limit(left=True)
-
-        blames = [self.parse_line(line) for line in blame_output.splitlines()]
-        blames = [b for b in blames if b]
+        blames = self.parse_blame(
+            blame_output, git_root(os.path.dirname(os.path.realpath(file_name)))
+        )
         if not blames:
-            self.communicate_error(
-                "Failed to parse anything for {0}. Has git's output format changed?".format(
-                    self.__class__.__name__
-                )
+            error = "Failed to parse anything for {0}. Has git's output format changed?".format(
+                self.__class__.__name__
             )
+            sublime.set_timeout(lambda: self.blame_failed(generation, error))
             return
 
+        result = self.format_blames(blames)
+        sublime.set_timeout(
+            lambda: self.apply_blame(file_name, generation, change_count, result)
+        )
+        if upgrade:
+            # On a thread of its own, it may take up to the budget and the
+            # worker thread is shared with every other plugin
+            threading.Thread(
+                target=self.upgrade_in_background,
+                args=(file_name, generation, change_count),
+                daemon=True,
+            ).start()
+
+    def upgrade_in_background(
+        self, file_name: str, generation: int, change_count: int
+    ) -> None:
+        try:
+            blame_output = self.get_full_blame_text(file_name, upgraded=True)
+        except Exception:
+            # Over budget or failed, the quick blame stays
+            return
+        blames = self.parse_blame(
+            blame_output, git_root(os.path.dirname(os.path.realpath(file_name)))
+        )
+        if not blames:
+            return
+        result = self.format_blames(blames)
+        sublime.set_timeout(
+            lambda: self.apply_upgrade(file_name, generation, change_count, result)
+        )
+
+    def blame_failed(self, generation: int, error) -> None:
+        if self.pending != generation:
+            return
+        self.cancel_pending()
+        self.communicate_error(error)
+
+    def format_blames(self, blames):
+        # Everything needed to build the phantoms, computed without touching
+        # the command's state so it can run on the worker thread
         hash_color = {}
-        self.sha_length = len(blames[0]["sha"])
-        self.raw_list_formatting = []
+        sha_length = len(blames[0][0].sha)
+        author_len = self.actual_author_max_len
+        raw_list_formatting = []
         counter = 0
         prev_sha = ""
         dim = False
         shas: List[str] = []
-        for blame in blames:
-            sha: str = blame["sha"]
+        for commit, line_number in blames:
+            sha: str = commit.sha
             shas.append(sha)
-            line_number = int(blame["line_number"])
 
             if prev_sha == sha:
                 phantom = (HunkType.SAME_AS_PREV_LINE, line_number)
-            elif sha == self.sha_length * "0":
+            elif sha == sha_length * "0":
                 phantom = (HunkType.NOT_COMMITTED, line_number)
                 prev_sha = sha
             else:
@@ -335,10 +580,10 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
                     sha_color = color_list[counter % len(color_list)]
                     hash_color[sha] = sha_color
                     counter += 1
-                raw_author: str = blame["author"]
-                if len(raw_author) > self.actual_author_max_len:
-                    self.actual_author_max_len = len(raw_author)
-                date: str = blame["date"]
+                raw_author: str = commit.author
+                if len(raw_author) > author_len:
+                    author_len = len(raw_author)
+                date: str = commit.date
                 try:
                     if not dim and hash_color[sha] == hash_color[prev_sha]:
                         dim = True
@@ -356,11 +601,68 @@ class BlameShowAll(BaseBlame, sublime_plugin.TextCommand):
                     dim,
                 )
                 prev_sha = sha
-            self.raw_list_formatting.append(phantom)
+            raw_list_formatting.append(phantom)
+        return raw_list_formatting, LineBlame(shas), sha_length, author_len
+
+    def apply_blame(
+        self, file_name: str, generation: int, change_count: int, result
+    ) -> None:
+        if self.pending != generation:
+            return
+        self.cancel_pending()
+        # Line numbers would be off if the view was edited while blaming
+        if self.view.change_count() != change_count:
+            return
+
+        self.view.settings().set(VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED, True)
+        self.settings_for_blame()
+        # Bring the phantoms into view without the user needing to manually scroll left.
+        self.horizontal_scroll_to_limit(left=True)
+        self.use_blame(file_name, result)
+
+    def apply_upgrade(
+        self, file_name: str, generation: int, change_count: int, result
+    ) -> None:
+        # Only while the quick blame it replaces is still shown as it was
+        if (
+            self.generation != generation
+            or self.pending
+            or self.view.change_count() != change_count
+            or not self.view.settings().get(VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED)
+        ):
+            return
+        self.use_blame(file_name, result)
 
-        self.view.settings().set("shas", shas)
+    def use_blame(self, file_name: str, result) -> None:
+        raw_list_formatting, line_blame, sha_length, author_len = result
+        self.highlighted_commit = ""
+        self.html_cache = {}
+        self.line_regions = []
+        self.raw_list_formatting = raw_list_formatting
+        self.sha_length = sha_length
+        self.actual_author_max_len = author_len
+        line_blames[self.view.id()] = line_blame
+        sublime.set_timeout_async(
+            lambda: self.prefetch_commit_messages(line_blame, file_name)
+        )
         self.phantom_setter()
 
+    def prefetch_commit_messages(self, line_blame: LineBlame, file_name: str) -> None:
+        # One git process for the messages of every commit in the file, so
+        # hovering never has to wait for one
+        shas = [sha for sha in line_blame.commits if sha.strip("^0")]
+        try:
+            line_blame.full_shas.update(
+                fetch_messages(
+                    git_binary(),
+                    git_root(os.path.dirname(os.path.realpath(file_name))),
+                    shas,
+                    caller=type(self).__name__,
+                )
+            )
+        except OSError as e:
+            print("Git blame: prefetching commit messages failed:", e)
+
     # Overrides (BaseBlame) ------------------------------------------------------------
 
     def _view(self) -> View:
@@ -1,9 +1,13 @@
+import os
 import threading
 
 import sublime
 import sublime_plugin
 
+from . import git_binary, git_root
 from .base import BaseBlame
+from .commits import cached_subject, fetch_messages
+from .dates import relative_date, timestamp
 from .settings import (
     PKG_SETTINGS_KEY_INLINE_BLAME_DELAY,
     PKG_SETTINGS_KEY_INLINE_BLAME_ENABLED,
@@ -15,6 +19,7 @@ from .templates import blame_inline_phantom_css, blame_inline_phantom_html_templ
 class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
 
     pkg_setting_callback_added = False
+    blame_kind = "inline"
 
     # Overrides (ViewEventListener) ----------------------------------------------------
 
@@ -22,6 +27,11 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
         super().__init__(view)
         self.phantom_set = sublime.PhantomSet(view, self.phantom_set_key())
         self.timer = None
+        # Bumped for every blame shown and caret move, an upgrade only
+        # replaces the blame it was started for
+        self.shown = 0
+        # git of the upgrade running for the blame shown, if any
+        self.upgrade_proc = None
         self.delay_seconds = (
             pkg_settings().get(PKG_SETTINGS_KEY_INLINE_BLAME_DELAY) / 1000
         )
@@ -53,7 +63,7 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
     # Overrides (BaseBlame) ------------------------------------------------------------
 
     def extra_cli_args(self, line_num):
-        return ["-L", "{0},{0}".format(line_num), "--date=relative"]
+        return ["-L", "{0},{0}".format(line_num)]
 
     def _view(self):
         return self.view
@@ -62,6 +72,9 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
         self.view.erase_phantoms(self.phantom_set_key())
 
     def rerun(self, **kwargs):
+        # Whatever is still being upgraded is for where the caret was
+        self.shown += 1
+        self.cancel_upgrade()
         if self.timer:
             self.timer.cancel()
         self.timer = threading.Timer(self.delay_seconds, self.show_inline_blame)
@@ -106,8 +119,6 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
             # If there have already been unsaved edits, stop the git child process from being ran at all.
             return
 
-        phantoms = []
-
         sels = self.view.sel()
         # @todo Support showing inline blame for multiple carets?
         # @body Maybe with a sanity check that there aren't too many (more than 10?)
@@ -119,34 +130,54 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
         if not phantom_pos:
             return
 
-        try:
-            blame_output = self.get_blame_text(
-                self.view.file_name(), line_num=caret_line_num
-            )
-        except Exception:  # Don't want to spam Console on failures.
-            return
-
-        blame = self.parse_line_with_relative_date(blame_output)
-        if not blame or blame["sha"] == "00000000":  # All zeros means uncommited change
-            return
-
-        height, width = self.view.viewport_extent()
-        summary = ""
-        if height > int(1400):
+        self.shown += 1
+        shown = self.shown
+        self.show_blame(phantom_pos, caret_line_num)
+        if self.upgrade_budget() is not None:
+            threading.Thread(
+                target=self.show_blame,
+                args=(phantom_pos, caret_line_num, True, shown),
+                daemon=True,
+            ).start()
+
+    def show_blame(self, phantom_pos, caret_line_num, upgraded=False, shown=0):
+        phantoms = []
+        # Blame-all, the warmer or an earlier session may have blamed the
+        # whole file already, then no git is needed
+        blame = self.cached_line_blame(caret_line_num, upgraded)
+        if not blame:
             try:
-                summary = self.get_commit_message_subject(
-                    blame["sha"], self.view.file_name()
+                blame_output = self.get_blame_text(
+                    self.view.file_name(),
+                    upgraded=upgraded,
+                    on_spawn=(
+                        (lambda proc: self.upgrade_started(proc, shown))
+                        if upgraded
+                        else None
+                    ),
+                    line_num=caret_line_num,
                 )
             except Exception:  # Don't want to spam Console on failures.
                 return
+            blame = self.parse_line(blame_output)
+        if upgraded and shown != self.shown:
+            return
+
+        # All zeros means uncommited change
+        if not blame or not blame["sha_normalised"].strip("0"):
+            return
+
+        summary = self.commit_subject(blame["sha_normalised"])
 
         phantom = sublime.Phantom(
             sublime.Region(phantom_pos),
             blame_inline_phantom_html_template.format(
                 css=blame_inline_phantom_css,
                 author=blame["author"],
-                date=blame["relative_date"],
-                qs_sha_val=blame["sha"],
+                date=relative_date(
+                    timestamp(blame["date"], blame["time"], blame["timezone"])
+                ),
+                qs_sha_val=blame["sha_normalised"],
                 summary_separator=" · " if summary else "",
                 summary=summary,
             ),
@@ -156,7 +187,65 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
         phantoms.append(phantom)
 
         # Dispatch back onto the main thread to serialize a final is_dirty check.
-        sublime.set_timeout(lambda: self.maybe_insert_phantoms(phantoms), 0)
+        sublime.set_timeout(
+            lambda: self.maybe_insert_phantoms(phantoms, shown if upgraded else None),
+            0,
+        )
+
+    def upgrade_started(self, proc, shown):
+        # Stored before shown is compared and rerun bumps shown before it
+        # looks here, so one of the two kills an upgrade the caret left
+        self.upgrade_proc = proc
+        if shown != self.shown:
+            self.cancel_upgrade()
+
+    def cancel_upgrade(self):
+        proc, self.upgrade_proc = self.upgrade_proc, None
+        if proc is None:
+            return
+        try:
+            proc.kill()
+        except OSError:
+            pass
+
+    def commit_subject(self, sha):
+        # Subjects are fetched for every commit of the file at once, so moving
+        # the caret around rarely needs git. The file's commits come from its
+        # whole blame, which later caret moves then read their blame from too.
+        root = git_root(os.path.dirname(os.path.realpath(self.view.file_name())))
+        subject = cached_subject(root, sha)
+        if subject is not None:
+            return subject
+        shas = {sha}
+        try:
+            text = self.get_full_blame_text(self.view.file_name())
+        except Exception:
+            text = None
+        for line in (text or "").splitlines():
+            shas.add(line.split(" ", 1)[0])
+        try:
+            fetch_messages(
+                git_binary(),
+                root,
+                [sha for sha in shas if sha.strip("^0")],
+                caller=type(self).__name__,
+            )
+        except Exception:  # Don't want to spam Console on failures.
+            return ""
+        return cached_subject(root, sha) or ""
+
+    def cached_line_blame(self, line_num, upgraded):
+        try:
+            text = self.cached_full_blame_text(self.view.file_name(), upgraded)
+        except Exception:
+            return None
+        lines = text.splitlines() if text else []
+        if line_num > len(lines):
+            return None
+        blame = self.parse_line(lines[line_num - 1])
+        if not blame or int(blame["line_number"]) != line_num:
+            return None
+        return blame
 
     def calculate_positions(self, user_selection):
         selection_goes_backwards = user_selection.a > user_selection.b
@@ -179,7 +268,9 @@ class BlameInlineListener(BaseBlame, sublime_plugin.ViewEventListener):
 
         return (phantom_pos, caret_line_num)
 
-    def maybe_insert_phantoms(self, phantoms):
+    def maybe_insert_phantoms(self, phantoms, shown=None):
+        if shown is not None and shown != self.shown:
+            return
         if not self.view.is_dirty():
             self.phantom_set.update(phantoms)
 
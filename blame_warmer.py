@@ -0,0 +1,182 @@
+import os
+import subprocess
+import threading
+from typing import Dict, List, Optional
+
+import sublime
+import sublime_plugin
+
+from . import git_binary, git_root
+from .base import blame_flags, upgrade_budget
+from .blamecache import cache_key, cached_blame, get
+from .gitdir import find_git_dir, read_head
+from .process import git_output
+from .settings import (
+    PKG_SETTINGS_KEY_BLAME_WARMER_COMMITS,
+    PKG_SETTINGS_KEY_BLAME_WARMER_ENABLED,
+    pkg_settings,
+)
+
+# Seconds between two looks at a repository's HEAD
+POLL_INTERVAL = 5.0
+# Files blamed after HEAD moved at most, the rest wait until they are opened
+MAX_FILES_PER_PASS = 50
+
+warmers: Dict[str, "BlameWarmer"] = {}
+warmers_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(pkg_settings().get(PKG_SETTINGS_KEY_BLAME_WARMER_ENABLED, False))
+
+
+def open_files(root: str) -> List[str]:
+    # The files of the repository open in any window
+    paths = []
+    prefix = root.rstrip(os.sep) + os.sep
+    for window in sublime.windows():
+        for view in window.views():
+            file_name = view.file_name()
+            if file_name and os.path.realpath(file_name).startswith(prefix):
+                paths.append(os.path.realpath(file_name))
+    return paths
+
+
+def repository_open(root: str) -> bool:
+    # Whether a window still has the repository as a folder or a file in it
+    for window in sublime.windows():
+        for folder in window.folders():
+            if git_root(os.path.realpath(folder)) == root:
+                return True
+    return bool(open_files(root))
+
+
+class BlameWarmer(threading.Thread):
+    # One per repository. Blames the files open in the editor and the files
+    # changed by the last commits, one low priority git process at a time,
+    # so the blame cache already has them when blame-all is shown. Starts
+    # over whenever HEAD moves, which is what a pull, checkout or commit
+    # looks like from here.
+
+    def __init__(self, root: str):
+        super().__init__(daemon=True)
+        self.root = root
+        self.git_dir = find_git_dir(root)
+        self.head: Optional[str] = None
+        self.queue: List[str] = []
+        self.queue_lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def request(self, paths: List[str]) -> None:
+        with self.queue_lock:
+            self.queue.extend(path for path in paths if path not in self.queue)
+        self.wake.set()
+
+    def run(self) -> None:
+        while True:
+            with warmers_lock:
+                if not enabled() or not repository_open(self.root):
+                    del warmers[self.root]
+                    return
+            head = read_head(self.git_dir) if self.git_dir else None
+            oid = head[1] if head else None
+            if oid and oid != self.head:
+                self.head = oid
+                self.request(open_files(self.root) + self.recently_changed())
+            while True:
+                with self.queue_lock:
+                    if not self.queue:
+                        break
+                    path = self.queue.pop(0)
+                self.warm(path)
+            self.wake.wait(POLL_INTERVAL)
+            self.wake.clear()
+
+    def recently_changed(self) -> List[str]:
+        commits = pkg_settings().get(PKG_SETTINGS_KEY_BLAME_WARMER_COMMITS, 20)
+        try:
+            output = git_output(
+                git_binary(),
+                [
+                    "log",
+                    "--max-count={0}".format(commits),
+                    "--name-only",
+                    "--no-renames",
+                    "--format=",
+                    "-z",
+                ],
+                self.root,
+                caller="BlameWarmer",
+                stderr=subprocess.DEVNULL,
+            )
+        except (subprocess.CalledProcessError, OSError):
+            return []
+        paths = []
+        for name in output.split(b"\0"):
+            name = name.strip(b"\n")
+            if not name:
+                continue
+            path = os.path.join(self.root, os.fsdecode(name))
+            if path not in paths and os.path.isfile(path):
+                paths.append(path)
+        return paths[:MAX_FILES_PER_PASS]
+
+    def warm(self, path: str) -> None:
+        # What blame-all runs first, and what it upgrades to if it does
+        profiles = [blame_flags("all")]
+        if upgrade_budget("all"):
+            profiles.append(blame_flags("all", upgraded=True))
+        for flags in profiles:
+            key = cache_key(self.root, path, flags)
+            if key is None or get(key) is not None:
+                continue
+            try:
+                cached_blame(
+                    git_binary(),
+                    self.root,
+                    path,
+                    flags,
+                    caller="BlameWarmer",
+                    low_priority=True,
+                )
+            except (subprocess.CalledProcessError, OSError, UnicodeDecodeError):
+                # Untracked, binary or gone by now
+                return
+
+
+def warm(root: str, paths: List[str]) -> None:
+    if not enabled():
+        return
+    with warmers_lock:
+        warmer = warmers.get(root)
+        if warmer is None:
+            warmer = warmers[root] = BlameWarmer(root)
+            warmer.start()
+    warmer.request(paths)
+
+
+def warm_window(window: sublime.Window) -> None:
+    roots = {git_root(os.path.realpath(folder)) for folder in window.folders()}
+    for view in window.views():
+        if view.file_name():
+            roots.add(git_root(os.path.realpath(os.path.dirname(view.file_name()))))
+    for root in roots:
+        if root:
+            warm(root, [])
+
+
+def plugin_loaded():
+    sublime.set_timeout_async(
+        lambda: [warm_window(window) for window in sublime.windows()]
+    )
+
+
+class BlameWarmerListener(sublime_plugin.EventListener):
+    def on_load_project_async(self, window):
+        warm_window(window)
+
+    def on_load_async(self, view):
+        file_name = view.file_name()
+        root = file_name and git_root(os.path.realpath(os.path.dirname(file_name)))
+        if root:
+            warm(root, [os.path.realpath(file_name)])
@@ -0,0 +1,235 @@
+import collections
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import sublime
+
+from .gitdir import find_git_dir, read_head
+from .process import git_output
+
+# The arguments every blame of the package starts with, flags and the file go
+# after them
+BLAME_ARGS = ["blame", "--show-name", "--minimal"]
+# How many whole file blames are kept in memory
+CACHE_SIZE = 64
+# How much the blames kept on disk may take, least recently used go first
+DISK_CACHE_MAX_BYTES = 64 << 20
+
+# A cache file is the magic, the length of the key, the key and the blame
+# output deflated. The key is kept to rule out hash collisions.
+DISK_MAGIC = b"GITBLAME1"
+DISK_HEADER = struct.Struct("<I")
+
+
+class BlameKey(NamedTuple):
+    # Blame of a file only changes when its content, the commit it is blamed
+    # against or the flags do
+    blob: str
+    head: str
+    path: str
+    flags: Tuple[str, ...]
+
+
+_blames: "collections.OrderedDict[BlameKey, str]" = collections.OrderedDict()
+_blames_lock = threading.Lock()
+
+
+def blob_oid(data: bytes) -> str:
+    # What `git hash-object` would say, without running it
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def cache_key(root: str, path: str, flags: Sequence[str]) -> Optional[BlameKey]:
+    # None if the file can't be read or there is no commit to blame against
+    git_dir = find_git_dir(root)
+    head = read_head(git_dir) if git_dir else None
+    if not head or not head[1]:
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return BlameKey(blob_oid(data), head[1], os.path.relpath(path, root), tuple(flags))
+
+
+def get(key: BlameKey) -> Optional[str]:
+    with _blames_lock:
+        text = _blames.get(key)
+        if text is not None:
+            _blames.move_to_end(key)
+            return text
+    text = _disk.load(key)
+    if text is not None:
+        _remember(key, text)
+    return text
+
+
+def put(key: BlameKey, text: str) -> None:
+    _remember(key, text)
+    _disk.store(key, text)
+
+
+def _remember(key: BlameKey, text: str) -> None:
+    with _blames_lock:
+        _blames[key] = text
+        _blames.move_to_end(key)
+        while len(_blames) > CACHE_SIZE:
+            _blames.popitem(last=False)
+
+
+def _key_bytes(key: BlameKey) -> bytes:
+    return "\0".join((key.blob, key.head, key.path) + key.flags).encode()
+
+
+class DiskCache(object):
+    # Blames that outlive the editor, one file each below the package's
+    # cache directory. Reading one bumps its mtime, which is what eviction
+    # goes by.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total: Optional[int] = None
+
+    def directory(self) -> str:
+        # Only known once the editor has loaded the plugin
+        return os.path.join(sublime.cache_path(), "Git", "blame")
+
+    def file_for(self, key: BlameKey) -> str:
+        name = hashlib.sha1(_key_bytes(key)).hexdigest()
+        return os.path.join(self.directory(), name[:2], name[2:])
+
+    def load(self, key: BlameKey) -> Optional[str]:
+        path = self.file_for(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        key_bytes = _key_bytes(key)
+        start = len(DISK_MAGIC) + DISK_HEADER.size
+        if not data.startswith(DISK_MAGIC) or len(data) < start:
+            return None
+        (key_length,) = DISK_HEADER.unpack_from(data, len(DISK_MAGIC))
+        if data[start : start + key_length] != key_bytes:
+            return None
+        try:
+            return zlib.decompress(data[start + key_length :]).decode()
+        except (zlib.error, UnicodeDecodeError):
+            return None
+
+    def store(self, key: BlameKey, text: str) -> None:
+        key_bytes = _key_bytes(key)
+        data = b"".join(
+            (
+                DISK_MAGIC,
+                DISK_HEADER.pack(len(key_bytes)),
+                key_bytes,
+                zlib.compress(text.encode()),
+            )
+        )
+        path = self.file_for(key)
+        temporary = "{0}.{1}.tmp".format(path, threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            print("Git blame: could not write the blame cache:", e)
+            return
+        with self.lock:
+            # The warmer and blame-all may store the same blame, what one of
+            # them replaces no longer counts
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            try:
+                os.replace(temporary, path)
+            except OSError as e:
+                print("Git blame: could not write the blame cache:", e)
+                return
+            if self.total is None:
+                self.total = sum(size for _, size, _ in self.entries())
+            else:
+                self.total += len(data) - replaced
+            if self.total > DISK_CACHE_MAX_BYTES:
+                self.evict()
+
+    def entries(self):
+        # (mtime, size, path) of every cache file
+        for dirpath, _, filenames in os.walk(self.directory()):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime_ns, st.st_size, path
+
+    def evict(self) -> None:
+        # Down to three quarters of the limit, so this doesn't run on every
+        # store once the cache is full
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= DISK_CACHE_MAX_BYTES * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.total = total
+
+
+_disk = DiskCache()
+
+
+def blame_file(
+    git: str,
+    path: str,
+    flags: Sequence[str],
+    caller: str = "",
+    low_priority: bool = False,
+    timeout: Optional[float] = None,
+) -> str:
+    return git_output(
+        git,
+        BLAME_ARGS + list(flags) + ["--", os.path.basename(path)],
+        os.path.dirname(path),
+        caller=caller,
+        low_priority=low_priority,
+        timeout=timeout,
+    ).decode()
+
+
+def lookup(root: str, path: str, flags: Sequence[str]) -> Optional[str]:
+    # Blame of the whole file if it is cached, never runs git
+    key = cache_key(root, os.path.realpath(path), flags)
+    return get(key) if key else None
+
+
+def cached_blame(
+    git: str,
+    root: str,
+    path: str,
+    flags: Sequence[str],
+    caller: str = "",
+    low_priority: bool = False,
+    timeout: Optional[float] = None,
+) -> str:
+    # Blame of the whole file as saved on disk
+    path = os.path.realpath(path)
+    key = cache_key(root, path, flags)
+    text = get(key) if key else None
+    if text is None:
+        text = blame_file(git, path, flags, caller, low_priority, timeout)
+        if key:
+            put(key, text)
+    return text
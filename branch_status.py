@@ -0,0 +1,141 @@
+import os
+import subprocess
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+import sublime
+import sublime_plugin
+
+from . import git_binary, git_root
+from .gitdir import find_git_dir, read_head, resolve_ref, upstream_ref
+from .process import git_output
+
+STATUS_KEY = "git-branch"
+# Seconds between two looks at a repository's HEAD
+POLL_INTERVAL = 2.0
+
+watchers: Dict[str, "BranchStatusWatcher"] = {}
+watchers_lock = threading.Lock()
+
+
+class BranchStatusWatcher(threading.Thread):
+    # One per repository. Polls HEAD and the refs it points at straight from
+    # the .git directory and pushes the result to the status bar of every
+    # registered view, but only when it changes. Ahead/behind counts need a
+    # git process, so they are only recomputed when one of the tips moved.
+
+    def __init__(self, root: str):
+        super().__init__(daemon=True)
+        self.root = root
+        self.git_dir = find_git_dir(root)
+        self.view_ids: Set[int] = set()
+        self.status = ""
+        self.wake = threading.Event()
+        self.divergence_key: Optional[Tuple[str, str]] = None
+        self.divergence = (0, 0)
+
+    def add_view(self, view: sublime.View) -> None:
+        self.view_ids.add(view.id())
+        if self.status:
+            view.set_status(STATUS_KEY, self.status)
+        # Something may just have changed, don't wait for the next poll
+        self.wake.set()
+
+    def run(self) -> None:
+        while True:
+            with watchers_lock:
+                self.view_ids = {
+                    view_id
+                    for view_id in self.view_ids
+                    if sublime.View(view_id).is_valid()
+                }
+                if not self.view_ids:
+                    del watchers[self.root]
+                    return
+            status = self.compute_status()
+            if status != self.status:
+                self.status = status
+                sublime.set_timeout(lambda: self.push(status), 0)
+            self.wake.wait(POLL_INTERVAL)
+            self.wake.clear()
+
+    def push(self, status: str) -> None:
+        for view_id in list(self.view_ids):
+            view = sublime.View(view_id)
+            if not view.is_valid():
+                continue
+            if status:
+                view.set_status(STATUS_KEY, status)
+            else:
+                view.erase_status(STATUS_KEY)
+
+    def compute_status(self) -> str:
+        head = read_head(self.git_dir) if self.git_dir else None
+        if head is None:
+            return ""
+        ref, oid = head
+        if ref is None:
+            return "git branch: (detached at {0})".format(oid[:7])
+        branch = ref[len("refs/heads/") :] if ref.startswith("refs/heads/") else ref
+        status = "git branch: " + branch
+        if oid:
+            ahead, behind = self.divergence_from_upstream(branch, oid)
+            if ahead:
+                status += " ↑{0}".format(ahead)
+            if behind:
+                status += " ↓{0}".format(behind)
+        return status
+
+    def divergence_from_upstream(self, branch: str, oid: str) -> Tuple[int, int]:
+        upstream = upstream_ref(self.git_dir, branch)
+        upstream_oid = resolve_ref(self.git_dir, upstream) if upstream else None
+        if not upstream_oid:
+            return (0, 0)
+        if self.divergence_key == (oid, upstream_oid):
+            return self.divergence
+        try:
+            output = git_output(
+                git_binary(),
+                [
+                    "rev-list",
+                    "--left-right",
+                    "--count",
+                    "{0}...{1}".format(oid, upstream_oid),
+                ],
+                self.root,
+                caller="BranchStatusWatcher",
+                stderr=subprocess.DEVNULL,
+            )
+            ahead, behind = output.split()
+            self.divergence = (int(ahead), int(behind))
+        except (subprocess.CalledProcessError, OSError, ValueError):
+            self.divergence = (0, 0)
+        self.divergence_key = (oid, upstream_oid)
+        return self.divergence
+
+
+def watch(view: sublime.View, root: str) -> None:
+    with watchers_lock:
+        watcher = watchers.get(root)
+        if watcher is None:
+            watcher = watchers[root] = BranchStatusWatcher(root)
+            watcher.start()
+        watcher.add_view(view)
+
+
+class GitBranchStatusCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        file_name = self.view.file_name()
+        root = file_name and git_root(os.path.realpath(os.path.dirname(file_name)))
+        if not root:
+            self.view.erase_status(STATUS_KEY)
+            return
+        watch(self.view, root)
+
+
+class GitBranchStatusListener(sublime_plugin.EventListener):
+    def on_load_async(self, view):
+        view.run_command("git_branch_status")
+
+    def on_activated_async(self, view):
+        view.run_command("git_branch_status")
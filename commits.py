@@ -0,0 +1,155 @@
+import collections
+import subprocess
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from .process import git_output
+
+# How many commit messages are kept, most recently used first out
+CACHE_SIZE = 2048
+# Commits a repository's table may hold before it starts over
+MAX_BLAME_COMMITS = 100000
+# Seconds a revision that couldn't be fetched isn't asked for again
+FAILED_FETCH_BACKOFF = 60.0
+
+_messages: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+_messages_lock = threading.Lock()
+# Abbreviated SHA -> full SHA, per directory git was run in
+_abbreviations: Dict[str, Dict[str, str]] = {}
+# Full SHA -> first line of its message. Kept apart from the messages so
+# fetching a file's commits can't evict its own subjects, however many.
+_subjects: Dict[str, str] = {}
+# Revision -> when fetching it failed, per directory git was run in
+_failures: Dict[str, Dict[str, float]] = {}
+
+
+class BlameCommit(NamedTuple):
+    # What blame says about a commit, the same for every line it blames
+    sha: str
+    author: str
+    date: str
+    time: str
+    timezone: str
+
+
+# Repository root -> SHA as blame prints it -> commit
+_blame_commits: Dict[str, Dict[str, BlameCommit]] = {}
+# Author names, shared by every repository and file
+_authors: Dict[str, str] = {}
+
+
+def blame_commit(
+    root: str, sha: str, author: str, date: str, time: str, timezone: str
+) -> BlameCommit:
+    # One BlameCommit per commit however many lines and files it is blamed
+    # for, so a blame costs memory by commits rather than by lines. Without
+    # a lock: racing threads build equal commits and one of them wins.
+    table = _blame_commits.get(root)
+    if table is None:
+        table = _blame_commits[root] = {}
+    commit = table.get(sha)
+    # An abbreviation may come to mean another commit as the repository grows
+    if commit is None or commit.date != date or commit.time != time:
+        if len(table) >= MAX_BLAME_COMMITS:
+            table.clear()
+        author = _authors.setdefault(author, author)
+        commit = table[sha] = BlameCommit(sha, author, date, time, timezone)
+    return commit
+
+
+def cached_message(sha: str) -> Optional[str]:
+    # The message of a commit by full SHA, if it has been fetched before
+    with _messages_lock:
+        message = _messages.get(sha)
+        if message is not None:
+            _messages.move_to_end(sha)
+        return message
+
+
+def cached_subject(cwd: str, revision: str) -> Optional[str]:
+    # The first line of a commit's message, by abbreviated SHA, if it has
+    # been fetched in the same directory before. "" if fetching it failed
+    # lately, so callers don't run git for it again and again.
+    revision = revision.strip("^")
+    with _messages_lock:
+        sha = _abbreviations.get(cwd, {}).get(revision)
+        if sha is None and _failed_lately(cwd, revision):
+            return ""
+        return _subjects.get(sha) if sha else None
+
+
+def _remember(sha: str, message: str) -> None:
+    with _messages_lock:
+        _messages[sha] = message
+        _messages.move_to_end(sha)
+        while len(_messages) > CACHE_SIZE:
+            _messages.popitem(last=False)
+
+
+def _failed_lately(cwd: str, revision: str) -> bool:
+    # With _messages_lock held
+    failed = _failures.get(cwd, {}).get(revision)
+    return failed is not None and time.monotonic() - failed < FAILED_FETCH_BACKOFF
+
+
+def fetch_messages(
+    git: str, cwd: str, revisions: Iterable[str], caller: str = ""
+) -> Dict[str, str]:
+    # Fetches the messages of any number of commits with a single git process
+    # and caches them. Returns the full SHA of each revision that was found,
+    # revisions may be abbreviated SHAs, e.g. from blame.
+    wanted = {revision.strip("^") for revision in revisions}
+    wanted.discard("")
+    with _messages_lock:
+        wanted = {revision for revision in wanted if not _failed_lately(cwd, revision)}
+    if not wanted:
+        return {}
+    try:
+        output = git_output(
+            git,
+            [
+                "log",
+                "--no-walk=unsorted",
+                # Unknown revisions are left out instead of failing the batch
+                "--ignore-missing",
+                "--stdin",
+                "-z",
+                "--format=%H%n%B",
+            ],
+            cwd,
+            caller=caller,
+            input="\n".join(sorted(wanted)).encode() + b"\n",
+            stderr=subprocess.DEVNULL,
+        )
+    except (subprocess.CalledProcessError, OSError):
+        _fetch_failed(cwd, wanted)
+        return {}
+
+    lengths = {len(revision) for revision in wanted}
+    full_shas: Dict[str, str] = {}
+    for record in output.decode("utf-8", "replace").split("\0"):
+        sha, _, message = record.partition("\n")
+        if not sha:
+            continue
+        message = message.rstrip()
+        _remember(sha, message)
+        with _messages_lock:
+            if len(_subjects) >= MAX_BLAME_COMMITS:
+                _subjects.clear()
+            _subjects[sha] = message.split("\n", 1)[0]
+        for length in lengths:
+            if sha[:length] in wanted:
+                full_shas[sha[:length]] = sha
+    with _messages_lock:
+        _abbreviations.setdefault(cwd, {}).update(full_shas)
+    _fetch_failed(cwd, wanted.difference(full_shas))
+    return full_shas
+
+
+def _fetch_failed(cwd: str, revisions: Iterable[str]) -> None:
+    now = time.monotonic()
+    with _messages_lock:
+        failures = _failures.setdefault(cwd, {})
+        for revision in revisions:
+            failures[revision] = now
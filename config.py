@@ -3,6 +3,7 @@ import os
 import sublime
 
 from . import GitWindowCommand, git_root
+from .gitdir import read_config
 
 
 class GitOpenConfigFileCommand(GitWindowCommand):
@@ -17,6 +18,10 @@ class GitOpenConfigFileCommand(GitWindowCommand):
 
 class GitOpenConfigUrlCommand(GitWindowCommand):
     def run(self, url_param):
+        git_dir = self.get_git_dir()
+        if git_dir:
+            self.url_done(read_config(git_dir).get(url_param, ""))
+            return
         self.run_command(["git", "config", url_param], self.url_done)
 
     def url_done(self, result):
@@ -2,6 +2,7 @@ import sublime
 import sublime_plugin
 
 from . import GitTextCommand, GitWindowCommand
+from .perf import report
 
 
 class GitCustomCommand(GitWindowCommand):
@@ -76,8 +77,19 @@ class GitRawCommand(GitWindowCommand):
 
 # called by GitWindowCommand
 class GitScratchOutputCommand(sublime_plugin.TextCommand):
-    def run(self, edit, output="", output_file=None, clear=False):
+    def run(self, edit, output="", output_file=None, clear=False, append=False):
         if clear:
             region = sublime.Region(0, self.view.size())
             self.view.erase(edit, region)
-        self.view.insert(edit, 0, output)
+        self.view.insert(edit, self.view.size() if append else 0, output)
+
+
+class GitPerformanceReportCommand(sublime_plugin.WindowCommand):
+    # Timings of the git processes started by this session, slowest first
+    def run(self):
+        view = self.window.new_file()
+        view.set_name("Git Performance Report")
+        view.set_scratch(True)
+        view.settings().set("word_wrap", False)
+        view.run_command("git_scratch_output", {"output": report()})
+        view.set_read_only(True)
@@ -0,0 +1,51 @@
+import functools
+import time
+from datetime import datetime
+from typing import Optional
+
+
+@functools.lru_cache(maxsize=4096)
+def timestamp(date: str, clock: str, timezone: str) -> int:
+    # Seconds since the epoch of blame's "2020-01-31 12:34:56 +0100"
+    return int(
+        datetime.strptime(
+            "{0} {1} {2}".format(date, clock, timezone), "%Y-%m-%d %H:%M:%S %z"
+        ).timestamp()
+    )
+
+
+def _plural(count: int, unit: str) -> str:
+    return "{0} {1}{2}".format(count, unit, "" if count == 1 else "s")
+
+
+def relative_date(when: int, now: Optional[float] = None) -> str:
+    # Same wording and rounding as git's --date=relative, so the text doesn't
+    # change when it is computed here instead
+    diff = int((time.time() if now is None else now) - when)
+    if diff < 0:
+        return "in the future"
+    if diff < 90:
+        return _plural(diff, "second") + " ago"
+    diff = (diff + 30) // 60
+    if diff < 90:
+        return _plural(diff, "minute") + " ago"
+    diff = (diff + 30) // 60
+    if diff < 36:
+        return _plural(diff, "hour") + " ago"
+    # Days from here on
+    diff = (diff + 12) // 24
+    if diff < 14:
+        return _plural(diff, "day") + " ago"
+    if diff < 70:
+        return _plural((diff + 3) // 7, "week") + " ago"
+    if diff < 365:
+        return _plural((diff + 15) // 30, "month") + " ago"
+    if diff < 1825:
+        months = (diff * 12 * 2 + 365) // (365 * 2)
+        years, months = divmod(months, 12)
+        if months:
+            return "{0}, {1} ago".format(
+                _plural(years, "year"), _plural(months, "month")
+            )
+        return _plural(years, "year") + " ago"
+    return _plural((diff + 183) // 365, "year") + " ago"
@@ -0,0 +1,414 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Reads repository state straight from the .git directory, for the places
+# where spawning git just to look at HEAD, a ref or a config value would cost
+# more than the answer is worth. None of this attempts to be a complete
+# reimplementation of git, callers fall back to running git whenever exact
+# semantics matter.
+
+# Symbolic refs pointing at symbolic refs pointing at ... give up eventually
+MAX_SYMREF_DEPTH = 5
+# Same limit git itself uses for nested config includes
+MAX_INCLUDE_DEPTH = 10
+
+_cache_lock = threading.Lock()
+_packed_refs_cache: Dict[str, Tuple[Optional[tuple], Dict[str, str]]] = {}
+_config_cache: Dict[str, Tuple[tuple, "GitConfig"]] = {}
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def find_git_dir(root: str) -> Optional[str]:
+    dot_git = os.path.join(root, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+    # Worktrees and submodules have a .git file pointing at the real directory
+    try:
+        with open(dot_git, encoding="utf-8") as f:
+            line = f.readline()
+    except OSError:
+        return None
+    if not line.startswith("gitdir:"):
+        return None
+    return os.path.normpath(os.path.join(root, line[len("gitdir:") :].strip()))
+
+
+def common_dir(git_dir: str) -> str:
+    # A linked worktree keeps its own HEAD but shares refs with the main repo
+    try:
+        with open(os.path.join(git_dir, "commondir"), encoding="utf-8") as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.readline().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+# Refs ------------------------------------------------------------------------
+
+
+def packed_refs(common: str) -> Dict[str, str]:
+    path = os.path.join(common, "packed-refs")
+    signature = _signature(path)
+    with _cache_lock:
+        cached = _packed_refs_cache.get(common)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    refs: Dict[str, str] = {}
+    if signature:
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    # Skip the header and the peeled values of annotated tags
+                    if line.startswith(("#", "^")):
+                        continue
+                    oid, _, name = line.rstrip("\n").partition(" ")
+                    refs[name] = oid
+        except (OSError, UnicodeDecodeError):
+            pass
+    with _cache_lock:
+        _packed_refs_cache[common] = (signature, refs)
+    return refs
+
+
+def resolve_ref(git_dir: str, ref: str) -> Optional[str]:
+    # Returns the object id `ref` points to, or None if it doesn't exist
+    common = common_dir(git_dir)
+    for _ in range(MAX_SYMREF_DEPTH):
+        # HEAD and other pseudo refs are per worktree, everything else is shared
+        base = git_dir if "/" not in ref else common
+        content = _read_first_line(os.path.join(base, ref))
+        if content is None:
+            return packed_refs(common).get(ref)
+        if not content.startswith("ref:"):
+            return content
+        ref = content[len("ref:") :].strip()
+    return None
+
+
+def read_head(git_dir: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    # Returns (symbolic ref, object id) for HEAD. The ref is None for a
+    # detached HEAD, the object id is None on an unborn branch.
+    content = _read_first_line(os.path.join(git_dir, "HEAD"))
+    if not content:
+        return None
+    if not content.startswith("ref:"):
+        return (None, content)
+    ref = content[len("ref:") :].strip()
+    return (ref, resolve_ref(git_dir, ref))
+
+
+def current_branch(git_dir: str) -> Optional[str]:
+    # Short name of the checked out branch, None when HEAD is detached
+    head = read_head(git_dir)
+    if not head or not head[0] or not head[0].startswith("refs/heads/"):
+        return None
+    return head[0][len("refs/heads/") :]
+
+
+def list_refs(git_dir: str, prefix: str) -> Dict[str, str]:
+    # All refs below `prefix` (e.g. "refs/heads/") mapped to their object ids.
+    # Symbolic refs such as refs/remotes/origin/HEAD are left out.
+    common = common_dir(git_dir)
+    refs = {
+        name: oid
+        for name, oid in packed_refs(common).items()
+        if name.startswith(prefix)
+    }
+    # Loose refs take precedence over packed ones
+    for dirpath, _, filenames in os.walk(os.path.join(common, prefix)):
+        for filename in filenames:
+            if filename.endswith(".lock"):
+                continue
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, common).replace(os.sep, "/")
+            content = _read_first_line(path)
+            if not content or content.startswith("ref:"):
+                refs.pop(name, None)
+            else:
+                refs[name] = content
+    return refs
+
+
+# Config ----------------------------------------------------------------------
+
+_SECTION_RE = re.compile(r'\[\s*([-.\w]+)\s*(?:"((?:[^"\\\n]|\\.)*)"\s*)?\]')
+_KEY_RE = re.compile(r"[A-Za-z][-A-Za-z0-9]*")
+_ESCAPES = {"t": "\t", "b": "\b", "n": "\n"}
+
+
+def _skip_line(text: str, pos: int) -> int:
+    end = text.find("\n", pos)
+    return len(text) if end == -1 else end + 1
+
+
+def _parse_value(text: str, pos: int) -> Tuple[str, int]:
+    # Follows config.c: surrounding whitespace is dropped, inner whitespace
+    # kept, quotes toggle, comments end the value and a trailing backslash
+    # continues it on the next line.
+    out: List[str] = []
+    spaces = 0
+    quoted = False
+    while pos < len(text):
+        c = text[pos]
+        pos += 1
+        if c == "\n":
+            break
+        if c == "\r" and text.startswith("\n", pos):
+            continue
+        if c in " \t" and not quoted:
+            if out:
+                spaces += 1
+            continue
+        if c in "#;" and not quoted:
+            return "".join(out), _skip_line(text, pos)
+        if spaces:
+            out.append(" " * spaces)
+            spaces = 0
+        if c == "\\":
+            if text.startswith("\r\n", pos):
+                pos += 2
+                continue
+            if text.startswith("\n", pos):
+                pos += 1
+                continue
+            if pos < len(text):
+                out.append(_ESCAPES.get(text[pos], text[pos]))
+                pos += 1
+            continue
+        if c == '"':
+            quoted = not quoted
+            continue
+        out.append(c)
+    return "".join(out), pos
+
+
+def parse_config(text: str) -> List[Tuple[str, str]]:
+    # Returns (key, value) pairs in file order. Section and variable names
+    # are lowercased, subsection names are case sensitive and kept as is.
+    entries = []
+    section: Optional[str] = None
+    pos = 0
+    while pos < len(text):
+        c = text[pos]
+        if c in " \t\r\n":
+            pos += 1
+            continue
+        if c in "#;":
+            pos = _skip_line(text, pos)
+            continue
+        if c == "[":
+            match = _SECTION_RE.match(text, pos)
+            if not match:
+                section = None
+                pos = _skip_line(text, pos)
+                continue
+            name, subsection = match.groups()
+            if subsection is not None:
+                subsection = re.sub(r"\\(.)", r"\1", subsection)
+                section = name.lower() + "." + subsection
+            elif "." in name:
+                # Deprecated [section.subsection] syntax
+                name, _, subsection = name.partition(".")
+                section = name.lower() + "." + subsection.lower()
+            else:
+                section = name.lower()
+            pos = match.end()
+            continue
+
+        match = _KEY_RE.match(text, pos)
+        if not match or section is None:
+            pos = _skip_line(text, pos)
+            continue
+        key = section + "." + match.group(0).lower()
+        pos = match.end()
+        while pos < len(text) and text[pos] in " \t":
+            pos += 1
+        if pos >= len(text) or text[pos] in "\r\n#;":
+            # A bare variable name means true
+            entries.append((key, "true"))
+            pos = _skip_line(text, pos)
+        elif text[pos] == "=":
+            value, pos = _parse_value(text, pos + 1)
+            entries.append((key, value))
+        else:
+            pos = _skip_line(text, pos)
+    return entries
+
+
+def _normalise_key(key: str) -> str:
+    section, _, rest = key.partition(".")
+    subsection, _, name = rest.rpartition(".")
+    if subsection:
+        return "{0}.{1}.{2}".format(section.lower(), subsection, name.lower())
+    return "{0}.{1}".format(section.lower(), name.lower())
+
+
+def _glob_to_regex(pattern: str) -> str:
+    # Just enough of wildmatch for includeIf patterns
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts) + r"\Z"
+
+
+class GitConfig(object):
+    def __init__(self, entries: List[Tuple[str, str]]):
+        self.entries = entries
+        self.values: Dict[str, List[str]] = {}
+        for key, value in entries:
+            self.values.setdefault(key, []).append(value)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        values = self.values.get(_normalise_key(key))
+        return values[-1] if values else default
+
+    def get_all(self, key: str) -> List[str]:
+        return list(self.values.get(_normalise_key(key), []))
+
+    def subsections(self, section: str) -> List[str]:
+        # e.g. subsections("remote") -> ["origin", "upstream"]
+        prefix = section.lower() + "."
+        names: List[str] = []
+        for key, _ in self.entries:
+            if not key.startswith(prefix):
+                continue
+            subsection = key[len(prefix) :].rpartition(".")[0]
+            if subsection and subsection not in names:
+                names.append(subsection)
+        return names
+
+
+class _ConfigReader(object):
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self.entries: List[Tuple[str, str]] = []
+        # Everything the result depends on, to tell when it goes stale
+        self.signature: List[tuple] = []
+
+    def read(self, path: str, depth: int = 0) -> None:
+        self.signature.append((path, _signature(path)))
+        try:
+            with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                text = f.read()
+        except OSError:
+            return
+        for key, value in parse_config(text):
+            self.entries.append((key, value))
+            if depth >= MAX_INCLUDE_DEPTH or not key.endswith(".path"):
+                continue
+            if key == "include.path" or (
+                key.startswith("includeif.") and self.condition_holds(key, path)
+            ):
+                self.read(self.include_path(value, path), depth + 1)
+
+    def include_path(self, value: str, including_file: str) -> str:
+        value = os.path.expanduser(value)
+        return os.path.join(os.path.dirname(including_file), value)
+
+    def condition_holds(self, key: str, including_file: str) -> bool:
+        condition = key[len("includeif.") : -len(".path")]
+        kind, _, pattern = condition.partition(":")
+        if kind == "onbranch":
+            head_path = os.path.join(self.git_dir, "HEAD")
+            self.signature.append((head_path, _signature(head_path)))
+            branch = current_branch(self.git_dir)
+            if branch is None:
+                return False
+            if pattern.endswith("/"):
+                pattern += "**"
+            return bool(re.match(_glob_to_regex(pattern), branch))
+        if kind not in ("gitdir", "gitdir/i"):
+            return False
+        if pattern.startswith("./"):
+            pattern = os.path.join(os.path.dirname(including_file), pattern[2:])
+        pattern = os.path.expanduser(pattern).replace(os.sep, "/")
+        if not pattern.startswith("/") and not re.match(r"[A-Za-z]:/", pattern):
+            pattern = "**/" + pattern
+        if pattern.endswith("/"):
+            pattern += "**"
+        flags = re.IGNORECASE if kind == "gitdir/i" else 0
+        regex = re.compile(_glob_to_regex(pattern), flags)
+        candidates = {self.git_dir, os.path.realpath(self.git_dir)}
+        return any(regex.match(c.replace(os.sep, "/")) for c in candidates)
+
+
+def _global_config_files() -> List[str]:
+    files = []
+    if not os.environ.get("GIT_CONFIG_NOSYSTEM"):
+        files.append(os.environ.get("GIT_CONFIG_SYSTEM", "/etc/gitconfig"))
+    if "GIT_CONFIG_GLOBAL" in os.environ:
+        files.append(os.environ["GIT_CONFIG_GLOBAL"])
+    else:
+        xdg = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        files.append(os.path.join(xdg, "git", "config"))
+        files.append(os.path.expanduser("~/.gitconfig"))
+    return files
+
+
+def read_config(git_dir: str) -> GitConfig:
+    # System, global, repository and worktree config merged in the order git
+    # reads them, cached until one of the files involved changes.
+    with _cache_lock:
+        cached = _config_cache.get(git_dir)
+    if cached and all(_signature(path) == sig for path, sig in cached[0]):
+        return cached[1]
+
+    reader = _ConfigReader(git_dir)
+    for path in _global_config_files():
+        reader.read(path)
+    reader.read(os.path.join(common_dir(git_dir), "config"))
+    config = GitConfig(reader.entries)
+    worktree_config = config.get("extensions.worktreeConfig", "false")
+    if worktree_config.lower() in ("true", "yes", "on", "1"):
+        reader.read(os.path.join(git_dir, "config.worktree"))
+        config = GitConfig(reader.entries)
+
+    with _cache_lock:
+        _config_cache[git_dir] = (tuple(reader.signature), config)
+    return config
+
+
+def upstream_ref(git_dir: str, branch: str) -> Optional[str]:
+    # The remote tracking ref of `branch`, assuming the default fetch refspec
+    config = read_config(git_dir)
+    remote = config.get("branch.{0}.remote".format(branch))
+    merge = config.get("branch.{0}.merge".format(branch))
+    if not remote or not merge:
+        return None
+    if remote == ".":
+        return merge
+    if merge.startswith("refs/heads/"):
+        merge = merge[len("refs/heads/") :]
+    return "refs/remotes/{0}/{1}".format(remote, merge)
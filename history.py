@@ -1,9 +1,34 @@
 import functools
+import os
 import re
+import subprocess
+import threading
+import time
+from typing import Dict, Tuple
 
 import sublime
 
-from . import GitTextCommand, GitWindowCommand, plugin_file
+from . import (
+    DECODE_CHUNK_SIZE,
+    GitTextCommand,
+    GitWindowCommand,
+    SafeishDecoder,
+    git_binary,
+    git_root,
+    parse_fallback_encoding,
+    plugin_file,
+)
+from .gitdir import find_git_dir, read_head
+from .perf import record
+from .process import git_popen
+
+# How many selection histories are kept
+SELECTION_HISTORY_CACHE_SIZE = 32
+# How often streamed output is added to the view
+SELECTION_HISTORY_FLUSH_S = 0.1
+
+# (HEAD commit, file, first line, last line) -> git log -L output
+_selection_histories: Dict[Tuple[str, str, int, int], str] = {}
 
 
 class GitLog(object):
@@ -28,7 +53,7 @@ class GitLog(object):
             "--follow" if follow else None,
         ]
         command.extend(args)
-        self.run_command(command, self.log_done)
+        self.run_latest_command("log", command, self.log_done)
 
     def log_done(self, result):
         self.results = [r.split("\a", 2) for r in result.strip().split("\n")]
@@ -46,7 +71,8 @@ class GitLog(object):
         # I'm not certain I should have the file name here; it restricts the
         # details to just the current file. Depends on what the user expects...
         # which I'm not sure of.
-        self.run_command(
+        self.run_latest_command(
+            "log_details",
             ["git", "log", "--no-color", "-p", "-1", ref, "--", self.get_file_name()],
             self.details_done,
         )
@@ -137,7 +163,8 @@ class GitShowCommitCommand(GitWindowCommand):
 class GitGraph(object):
     def run(self, edit=None):
         filename = self.get_file_name()
-        self.run_command(
+        self.run_latest_command(
+            "graph",
             [
                 "git",
                 "log",
@@ -242,3 +269,110 @@ class GitGotoCommit(GitTextCommand):
         return self.view.match_selector(
             selection.a, "text.git-blame"
         ) or self.view.match_selector(selection.a, "text.git-graph")
+
+
+class GitSelectionHistoryCommand(GitTextCommand):
+    # Every commit that changed the selected lines, with the diffs, from one
+    # `git log -L`. Output is added to the view as git produces it.
+    def run(self, edit):
+        view = self.view
+        region = view.sel()[0]
+        first = view.rowcol(region.begin())[0] + 1
+        last, col = view.rowcol(region.end())
+        # A selection of whole lines ends at the start of the next one
+        last = last if col == 0 and last + 1 > first else last + 1
+
+        root = git_root(self.get_working_dir())
+        path = os.path.relpath(os.path.realpath(view.file_name()), root)
+        path = path.replace("\\", "/")
+        git_dir = find_git_dir(root)
+        head = read_head(git_dir) if git_dir else None
+        key = ((head or (None, None))[1], path, first, last)
+
+        scratch = self.scratch(
+            "",
+            title="Git History: %s:%d-%d" % (path, first, last),
+            syntax="Packages/Git Formats/Git Log.sublime-syntax",
+        )
+        scratch.settings().set("git_root_dir", root)
+        output = _selection_histories.get(key) if key[0] else None
+        if output is not None:
+            self.append(scratch, output)
+            return
+
+        fallback_encoding = view.settings().get("fallback_encoding")
+        fallback_encoding = parse_fallback_encoding(fallback_encoding or "")
+        args = ["log", "-L", "%d,%d:%s" % (first, last, path), "--no-color"]
+        # On a thread of its own, deep histories take minutes and the worker
+        # thread is shared with every other plugin
+        threading.Thread(
+            target=self.stream,
+            args=(scratch, args, root, key, fallback_encoding),
+            daemon=True,
+        ).start()
+
+    def stream(self, scratch, args, root, key, fallback_encoding):
+        git = git_binary()
+        started = time.perf_counter()
+        try:
+            proc = git_popen(
+                git,
+                args,
+                root,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+        except OSError as e:
+            error = "{0} could not be run: {1}\n".format(git, e.strerror or e)
+            sublime.set_timeout(lambda: self.append(scratch, error))
+            return
+        spawned = time.perf_counter()
+        decoder = SafeishDecoder(fallback_encoding)
+        parts = []
+        pending = []
+        flushed = spawned
+        total = 0
+        while True:
+            chunk = proc.stdout.read1(DECODE_CHUNK_SIZE)
+            if not scratch.is_valid():
+                # Closed before git was done
+                proc.kill()
+                break
+            if chunk:
+                total += len(chunk)
+                pending.append(decoder.decode(chunk))
+            else:
+                pending.append(decoder.decode(b"", True))
+            now = time.perf_counter()
+            if pending and (not chunk or now - flushed > SELECTION_HISTORY_FLUSH_S):
+                text = "".join(pending)
+                parts.append(text)
+                pending = []
+                flushed = now
+                sublime.set_timeout(lambda text=text: self.append(scratch, text))
+            if not chunk:
+                break
+        proc.stdout.close()
+        proc.wait()
+        record(
+            [git] + args,
+            root,
+            type(self).__name__,
+            0.0,
+            spawned - started,
+            time.perf_counter() - spawned,
+            total,
+            proc.returncode,
+        )
+        if proc.returncode == 0 and key[0]:
+            if len(_selection_histories) >= SELECTION_HISTORY_CACHE_SIZE:
+                _selection_histories.pop(next(iter(_selection_histories)))
+            _selection_histories[key] = "".join(parts)
+
+    def append(self, scratch, text):
+        if not scratch.is_valid():
+            return
+        scratch.set_read_only(False)
+        scratch.run_command("git_scratch_output", {"output": text, "append": True})
+        scratch.set_read_only(True)
@@ -0,0 +1,96 @@
+import subprocess
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .process import git_output
+
+# How many line histories are kept, they never go stale since they start at
+# a commit
+CACHE_SIZE = 256
+
+LOG_FORMAT = "--format=%x00%H%x00%h%x00%an%x00%ad"
+
+
+class LineCommit(NamedTuple):
+    sha: str
+    short_sha: str
+    author: str
+    date: str
+    time: str
+
+
+_histories: Dict[Tuple[str, str, str, int], List[LineCommit]] = {}
+_histories_lock = threading.Lock()
+
+
+def line_origin(
+    git: str, root: str, path: str, line: int, flags: Sequence[str] = (), caller=""
+) -> Optional[Tuple[str, str, int]]:
+    # The commit that last changed a line of the working tree file, with the
+    # file name and line number the line had in that commit. None if the line
+    # isn't committed yet.
+    output = git_output(
+        git,
+        ["blame", "--porcelain", "-L", "{0},{0}".format(line), *flags, "--", path],
+        root,
+        caller=caller,
+    ).decode("utf-8", "replace")
+    header, *rest = output.splitlines()
+    sha, orig_line = header.split()[:2]
+    if sha.strip("0") == "":
+        return None
+    filename = path
+    for field in rest:
+        if field.startswith("filename "):
+            filename = field[len("filename ") :]
+            break
+    return sha, filename, int(orig_line)
+
+
+def line_history(
+    git: str, root: str, sha: str, filename: str, line: int, caller=""
+) -> List[LineCommit]:
+    # Every commit that changed the line, newest first, starting with sha.
+    # One `git log -L` covers the whole ancestry, so stepping through it
+    # afterwards doesn't run git at all.
+    key = (root, sha, filename, line)
+    with _histories_lock:
+        history = _histories.get(key)
+    if history is not None:
+        return history
+
+    try:
+        output = git_output(
+            git,
+            [
+                "log",
+                "-L",
+                "{0},{0}:{1}".format(line, filename),
+                "--no-patch",
+                "--date=iso",
+                LOG_FORMAT,
+                sha,
+            ],
+            root,
+            caller=caller,
+            stderr=subprocess.DEVNULL,
+        )
+    except subprocess.CalledProcessError:
+        return [LineCommit(sha, sha[:8], "", "", "")]
+
+    history = []
+    for record in output.decode("utf-8", "replace").splitlines():
+        # Older git prints the diffs even with --no-patch, those lines have
+        # no NUL in them
+        fields = record.split("\0")
+        if len(fields) != 5:
+            continue
+        full_sha, short_sha, author, date = fields[1:]
+        day, _, rest = date.partition(" ")
+        history.append(LineCommit(full_sha, short_sha, author, day, rest[:8]))
+
+    with _histories_lock:
+        if len(_histories) >= CACHE_SIZE:
+            _histories.pop(next(iter(_histories)))
+        _histories[key] = history
+    return history
@@ -0,0 +1,150 @@
+import collections
+import time
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence
+
+# How many git invocations are kept around for the performance report
+HISTORY_SIZE = 2000
+# Options of git itself that take a value, e.g. `git -C <dir> log`
+_GIT_OPTIONS_WITH_VALUE = ("-C", "-c", "--git-dir", "--work-tree", "--namespace")
+
+_HEADER = "{0:<16}{1:>7}{2:>7}{3:>10}{4:>10}{5:>10}{6:>10}{7:>11}{8:>11}{9:>10}"
+_ROW = (
+    "{0:<16}{1:>7}{2:>7}{3:>10.1f}{4:>10.1f}{5:>10.1f}{6:>10.1f}"
+    "{7:>11.1f}{8:>11.1f}{9:>10.1f}"
+)
+
+
+class GitInvocation(NamedTuple):
+    command: str
+    args: Sequence[str]
+    repo: str
+    caller: str
+    # All durations in seconds
+    queue_wait: float
+    spawn: float
+    run: float
+    output_bytes: int
+    exit_code: Optional[int]
+    finished: float
+
+
+# deque.append is atomic, so worker threads can record without a lock
+_history: Deque[GitInvocation] = collections.deque(maxlen=HISTORY_SIZE)
+
+
+def command_type(args: Sequence[str]) -> str:
+    # The git subcommand, skipping the binary and git's own options
+    skip = False
+    for arg in args[1:]:
+        if skip:
+            skip = False
+        elif arg in _GIT_OPTIONS_WITH_VALUE:
+            skip = True
+        elif not arg.startswith("-"):
+            return arg
+    return args[0] if args else "?"
+
+
+def record(
+    args: Sequence[str],
+    repo: str,
+    caller: str,
+    queue_wait: float,
+    spawn: float,
+    run: float,
+    output_bytes: int,
+    exit_code: Optional[int],
+) -> None:
+    _history.append(
+        GitInvocation(
+            command_type(args),
+            tuple(args),
+            repo,
+            caller,
+            queue_wait,
+            spawn,
+            run,
+            output_bytes,
+            exit_code,
+            time.time(),
+        )
+    )
+
+
+def history() -> List[GitInvocation]:
+    return list(_history)
+
+
+def percentile(values: List[float], p: float) -> float:
+    # Nearest-rank percentile of already sorted values
+    if not values:
+        return 0.0
+    rank = int(round(p / 100 * len(values) + 0.5)) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+def report() -> str:
+    invocations = history()
+    if not invocations:
+        return "No git invocations recorded yet.\n"
+
+    by_command: Dict[str, List[GitInvocation]] = collections.defaultdict(list)
+    for invocation in invocations:
+        by_command[invocation.command].append(invocation)
+
+    lines = [
+        "Git: Performance Report ({0} invocations)".format(len(invocations)),
+        "",
+        "Times in ms. total = queue wait + spawn + run.",
+        "",
+        _HEADER.format(
+            "command",
+            "count",
+            "fails",
+            "p50",
+            "p90",
+            "p99",
+            "max",
+            "queue p50",
+            "spawn p50",
+            "KiB p50",
+        ),
+    ]
+    ordered = sorted(
+        by_command.items(),
+        key=lambda item: -sum(i.queue_wait + i.spawn + i.run for i in item[1]),
+    )
+    for command, group in ordered:
+        totals = sorted((i.queue_wait + i.spawn + i.run) * 1000 for i in group)
+        queue = sorted(i.queue_wait * 1000 for i in group)
+        spawn = sorted(i.spawn * 1000 for i in group)
+        size = sorted(i.output_bytes / 1024 for i in group)
+        lines.append(
+            _ROW.format(
+                command[:15],
+                len(group),
+                sum(1 for i in group if i.exit_code != 0),
+                percentile(totals, 50),
+                percentile(totals, 90),
+                percentile(totals, 99),
+                totals[-1],
+                percentile(queue, 50),
+                percentile(spawn, 50),
+                percentile(size, 50),
+            )
+        )
+
+    lines.extend(["", "Slowest invocations:", ""])
+    slowest = sorted(invocations, key=lambda i: -(i.queue_wait + i.spawn + i.run))
+    for invocation in slowest[:10]:
+        lines.append(
+            "{0:>10.1f} ms  {1:<24} exit {2}  {3}\n{4:>14}{5}".format(
+                (invocation.queue_wait + invocation.spawn + invocation.run) * 1000,
+                invocation.caller,
+                invocation.exit_code,
+                invocation.repo,
+                "",
+                " ".join(invocation.args[1:])[:200],
+            )
+        )
+    return "\n".join(lines) + "\n"
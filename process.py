@@ -0,0 +1,93 @@
+import os
+import shutil
+import subprocess
+import time
+from typing import Callable, List, Optional
+
+from .perf import record
+
+# subprocess launches children with posix_spawn() (vfork semantics on glibc
+# and macOS) instead of fork()+exec() when it can. With fork the kernel first
+# has to copy the page tables of the whole plugin host, which gets slow once
+# it holds a few GB. It can't when a cwd is given, fds are to be closed or the
+# executable isn't an absolute path, so git_popen avoids all three.
+POSIX_SPAWN = getattr(subprocess, "_USE_POSIX_SPAWN", False)
+# Niceness of background work, like precomputing blame
+LOW_PRIORITY_NICENESS = 10
+
+
+def resolve_executable(name: str, path: Optional[str] = None) -> str:
+    if os.path.isabs(name):
+        return name
+    return shutil.which(name, path=path) or name
+
+
+def git_popen(
+    git: str, args: List[str], cwd: Optional[str] = None, **kwargs
+) -> subprocess.Popen:
+    if POSIX_SPAWN and os.path.isabs(git) and not kwargs.get("shell"):
+        # git changes into the working directory itself
+        if cwd:
+            args = ["-C", cwd] + args
+        return subprocess.Popen([git] + args, close_fds=False, **kwargs)
+    return subprocess.Popen([git] + args, cwd=cwd or None, **kwargs)
+
+
+def git_output(
+    git: str,
+    args: List[str],
+    cwd: Optional[str] = None,
+    caller: str = "",
+    input: Optional[bytes] = None,
+    low_priority: bool = False,
+    timeout: Optional[float] = None,
+    on_spawn: Optional[Callable[[subprocess.Popen], None]] = None,
+    **kwargs,
+) -> bytes:
+    # check_output() for git_popen. on_spawn gets the process as soon as it
+    # runs, e.g. to kill it from another thread.
+    if low_priority and os.name == "nt":
+        kwargs["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+    started = time.perf_counter()
+    proc = git_popen(
+        git,
+        args,
+        cwd,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=kwargs.pop("stderr", subprocess.STDOUT),
+        **kwargs,
+    )
+    spawned = time.perf_counter()
+    if low_priority and os.name != "nt":
+        # A preexec_fn calling os.nice() would rule out posix_spawn
+        try:
+            os.setpriority(os.PRIO_PROCESS, proc.pid, LOW_PRIORITY_NICENESS)
+        except OSError:
+            pass
+    if on_spawn:
+        on_spawn(proc)
+    timed_out = False
+    try:
+        output = proc.communicate(input, timeout=timeout)[0]
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        output = proc.communicate()[0]
+        timed_out = True
+    record(
+        [git] + args,
+        cwd or "",
+        caller,
+        0.0,
+        spawned - started,
+        time.perf_counter() - spawned,
+        len(output),
+        proc.returncode,
+    )
+    if timed_out:
+        raise subprocess.TimeoutExpired([git] + args, timeout, output=output)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(
+            proc.returncode, [git] + args, output=output
+        )
+    return output
@@ -0,0 +1,112 @@
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from .gitdir import common_dir, list_refs
+
+# for-each-ref output the index is built from: name, object id and the date
+# of the commit or annotated tag, NUL separated
+FOR_EACH_REF_FORMAT = "--format=%(refname)%00%(objectname)%00%(creatordate:unix)"
+# Past this many changed refs asking git for everything is cheaper than
+# passing each of them on the command line
+MAX_REF_PATTERNS = 200
+
+_indexes: Dict[Tuple[str, str], "RefIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def _tree_signature(common: str, prefix: str) -> tuple:
+    # Creating, deleting or updating a loose ref renames a file into its
+    # directory, which bumps that directory's mtime
+    signature = []
+    for dirpath, _, _ in os.walk(os.path.join(common, prefix)):
+        try:
+            signature.append((dirpath, os.stat(dirpath).st_mtime_ns))
+        except OSError:
+            pass
+    try:
+        st = os.stat(os.path.join(common, "packed-refs"))
+        signature.append(("packed-refs", st.st_mtime_ns, st.st_size))
+    except OSError:
+        pass
+    return tuple(signature)
+
+
+class RefIndex(object):
+    # The refs below one prefix (e.g. "refs/tags/") of one repository, with
+    # their object ids and dates, kept sorted most recent first so quick
+    # panels can be shown straight from memory. When refs change only the
+    # ones that moved are looked up again.
+
+    def __init__(self, git_dir: str, prefix: str):
+        self.git_dir = git_dir
+        self.prefix = prefix
+        self.refs: Dict[str, Tuple[str, int]] = {}
+        self.ordered: List[str] = []
+        self.signature: Optional[tuple] = None
+        self.pending_signature: Optional[tuple] = None
+        # The refs list_refs saw when the fetch was planned
+        self.pending_names: Set[str] = set()
+
+    def plan(self) -> List[str]:
+        # Returns the for-each-ref patterns that need to be fetched and passed
+        # to `merge` before the index is current, usually none at all.
+        signature = _tree_signature(common_dir(self.git_dir), self.prefix)
+        if signature == self.signature:
+            return []
+        current = list_refs(self.git_dir, self.prefix)
+        for name in list(self.refs):
+            if name not in current:
+                del self.refs[name]
+        changed = [
+            name
+            for name, oid in current.items()
+            if name not in self.refs or self.refs[name][0] != oid
+        ]
+        self.pending_signature = signature
+        self.pending_names = set(current)
+        if not changed:
+            self.signature = signature
+            self.sort()
+            return []
+        return changed if len(changed) <= MAX_REF_PATTERNS else [self.prefix]
+
+    def merge(self, output: str) -> bool:
+        # Returns whether the fetch worked. Only then is the signature taken,
+        # otherwise the next `plan` asks for the changed refs again. Refs were
+        # asked for, so no output at all is a failure too.
+        fetched = bool(output)
+        for line in output.splitlines():
+            fields = line.split("\0")
+            if len(fields) != 3:
+                # git's error message, stderr goes to the same pipe
+                fetched = False
+                continue
+            name, oid, date = fields
+            # Fetching a whole prefix also lists symbolic refs such as
+            # origin/HEAD, which list_refs leaves out
+            if name not in self.pending_names:
+                continue
+            self.refs[name] = (oid, int(date) if date.isdigit() else 0)
+        if fetched:
+            self.signature = self.pending_signature
+        self.sort()
+        return fetched
+
+    def sort(self) -> None:
+        self.ordered = sorted(
+            self.refs, key=lambda name: (-self.refs[name][1], name)
+        )
+
+    def names(self) -> List[str]:
+        # Short names, most recent first
+        return [name[len(self.prefix) :] for name in self.ordered]
+
+
+def ref_index(git_dir: str, prefix: str) -> RefIndex:
+    key = (os.path.realpath(git_dir), prefix)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RefIndex(git_dir, prefix)
+    return index
@@ -0,0 +1,176 @@
+import os
+import subprocess
+import time
+from typing import List, Set, Tuple, Union
+
+import sublime
+
+from .process import git_output
+
+# How often to check whether a reverted view has finished loading.
+LOADING_POLL_MS = 50
+# How many views may be reloading at the same time.
+MAX_CONCURRENT_RELOADS = 8
+
+
+def _run_git(git: str, root: str, args: List[str]) -> bytes:
+    return git_output(
+        git, args, root, caller="RefreshPass", stderr=subprocess.DEVNULL
+    )
+
+
+def _split_z(output: bytes) -> List[str]:
+    return [os.fsdecode(path) for path in output.split(b"\0") if path]
+
+
+class RefreshPass(object):
+    # Figures out which files a git command touched, so that only the open
+    # views of those files get reloaded afterwards. `snapshot` runs before the
+    # command and `run` after it, both on the command's worker thread.
+
+    def __init__(self, git: str, root: str):
+        self.git = git
+        self.root = root
+        self.head_before: Union[None, str] = None
+        self.dirty_before: Set[str] = set()
+
+    def snapshot(self) -> None:
+        self.head_before = self.head()
+        self.dirty_before = self.dirty_paths()
+
+    def head(self) -> Union[None, str]:
+        try:
+            output = _run_git(
+                self.git, self.root, ["rev-parse", "-q", "--verify", "HEAD"]
+            )
+        except (subprocess.CalledProcessError, OSError):
+            return None
+        return output.decode("ascii").strip() or None
+
+    def dirty_paths(self) -> Set[str]:
+        try:
+            output = _run_git(
+                self.git,
+                self.root,
+                ["status", "--porcelain", "-z", "--untracked-files=no"],
+            )
+        except (subprocess.CalledProcessError, OSError):
+            return set()
+        paths = set()
+        entries = iter(_split_z(output))
+        for entry in entries:
+            paths.add(entry[3:])
+            # Renames and copies are followed by their original path
+            if entry[0] in "RC" or entry[1] in "RC":
+                paths.add(next(entries, ""))
+        paths.discard("")
+        return paths
+
+    def changed_paths(self) -> Set[str]:
+        # A file can only have changed if it was dirty before or after the
+        # command, or if it differs between the old and the new HEAD. The
+        # latter is a single diff no matter how many files a checkout touched.
+        paths = self.dirty_before | self.dirty_paths()
+        head_after = self.head()
+        if self.head_before and head_after and self.head_before != head_after:
+            try:
+                output = _run_git(
+                    self.git,
+                    self.root,
+                    ["diff", "--name-only", "-z", self.head_before, head_after, "--"],
+                )
+                paths.update(_split_z(output))
+            except (subprocess.CalledProcessError, OSError):
+                pass
+        return {os.path.normpath(os.path.join(self.root, path)) for path in paths}
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        views = stale_views(self.changed_paths())
+        if views:
+            sublime.set_timeout(ReloadBatch(views, started).step, 0)
+
+
+def stale_views(paths: Set[str]) -> List[sublime.View]:
+    if not paths:
+        return []
+    views = []
+    for window in sublime.windows():
+        for view in window.views():
+            file_name = view.file_name()
+            if not file_name or view.is_dirty() or view.is_loading():
+                continue
+            if os.path.realpath(file_name) not in paths:
+                continue
+            if matches_disk(view, file_name):
+                continue
+            views.append(view)
+    return views
+
+
+def matches_disk(view: sublime.View, file_name: str) -> bool:
+    try:
+        with open(file_name, "rb") as f:
+            data = f.read()
+    except OSError:
+        return False
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Not worth guessing the view's encoding, just reload it
+        return False
+    # Sublime normalises line endings in the buffer
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if len(text) != view.size():
+        return False
+    return text == view.substr(sublime.Region(0, view.size()))
+
+
+class ReloadBatch(object):
+    # Reverts views a few at a time, restoring each one's selection and
+    # viewport once it has finished loading. Lives on the main thread.
+
+    def __init__(self, views: List[sublime.View], started: float):
+        self.pending = list(views)
+        self.loading: List[Tuple[sublime.View, List[sublime.Region], tuple]] = []
+        self.reloaded = 0
+        self.started = started
+
+    def step(self) -> None:
+        still_loading = []
+        for view, selection, position in self.loading:
+            if view.is_valid() and view.is_loading():
+                still_loading.append((view, selection, position))
+            elif view.is_valid():
+                restore_view(view, selection, position)
+                self.reloaded += 1
+        self.loading = still_loading
+
+        while self.pending and len(self.loading) < MAX_CONCURRENT_RELOADS:
+            view = self.pending.pop(0)
+            # The user may have started editing since we checked
+            if not view.is_valid() or view.is_dirty():
+                continue
+            self.loading.append((view, list(view.sel()), view.viewport_position()))
+            view.run_command("revert")
+
+        if self.loading or self.pending:
+            sublime.set_timeout(self.step, LOADING_POLL_MS)
+        elif self.reloaded:
+            elapsed = (time.perf_counter() - self.started) * 1000
+            sublime.status_message(
+                "Git: reloaded {0} file{1} in {2:.0f} ms".format(
+                    self.reloaded, "" if self.reloaded == 1 else "s", elapsed
+                )
+            )
+
+
+def restore_view(
+    view: sublime.View, selection: List[sublime.Region], position: tuple
+) -> None:
+    size = view.size()
+    view.sel().clear()
+    view.sel().add_all(
+        [sublime.Region(min(r.a, size), min(r.b, size)) for r in selection]
+    )
+    view.set_viewport_position(position, False)
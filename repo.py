@@ -1,8 +1,11 @@
+import functools
 import os
 
 import sublime
 
 from . import GitWindowCommand, git_root_exist
+from .gitdir import current_branch, read_config, read_head
+from .refindex import FOR_EACH_REF_FORMAT, ref_index
 
 
 class GitInit(object):
@@ -29,16 +32,55 @@ class GitInitCommand(GitInit, GitWindowCommand):
             return False
 
 
-class GitBranchCommand(GitWindowCommand):
+class GitRefIndexMixin(object):
+    # Serves ref lists from the repository's cached RefIndex, only asking
+    # git about the refs that changed since the last time.
+    def load_refs(self, prefix, on_loaded):
+        git_dir = self.get_git_dir()
+        if not git_dir:
+            return False
+        index = ref_index(git_dir, prefix)
+        patterns = index.plan()
+        if patterns:
+            self.run_command(
+                ["git", "for-each-ref", FOR_EACH_REF_FORMAT] + patterns,
+                functools.partial(self.refs_fetched, index, on_loaded),
+                show_status=False,
+            )
+        else:
+            on_loaded(index)
+        return True
+
+    def refs_fetched(self, index, on_loaded, result):
+        index.merge(result)
+        on_loaded(index)
+
+
+class GitBranchCommand(GitRefIndexMixin, GitWindowCommand):
     may_change_files = True
     command_to_run_after_branch = ["checkout"]
     extra_flags = []
 
     def run(self):
+        # Plain local and remote listings come from the ref index
+        if self.extra_flags in ([], ["--remote"]):
+            prefix = "refs/remotes/" if self.extra_flags else "refs/heads/"
+            if self.load_refs(prefix, self.branches_loaded):
+                return
         self.run_command(
             ["git", "branch", "--no-color"] + self.extra_flags, self.branch_done
         )
 
+    def branches_loaded(self, index):
+        # Same shape as the output of `git branch`, most recent first
+        head = read_head(index.git_dir)
+        current = head[0] if head else None
+        self.results = [
+            ("* " if index.prefix + name == current else "  ") + name
+            for name in index.names()
+        ]
+        self.quick_panel(self.results, self.panel_done, sublime.MONOSPACE_FONT)
+
     def branch_done(self, result):
         self.results = result.rstrip().split("\n")
         self.quick_panel(self.results, self.panel_done, sublime.MONOSPACE_FONT)
@@ -53,6 +95,7 @@ class GitBranchCommand(GitWindowCommand):
         self.run_command(
             ["git"] + self.command_to_run_after_branch + [picked_branch],
             self.update_status,
+            refresh=self.may_change_files,
         )
 
     def update_status(self, result):
@@ -113,17 +156,26 @@ class GitNewTagCommand(GitWindowCommand):
         self.run_command(["git", "tag", tagname])
 
 
-class GitDeleteTagCommand(GitWindowCommand):
+class GitTagPanel(GitRefIndexMixin):
     def run(self):
-        self.run_command(["git", "tag"], self.fetch_tag)
+        if not self.load_refs("refs/tags/", self.tags_loaded):
+            self.run_command(["git", "tag"], self.fetch_tag)
+
+    def tags_loaded(self, index):
+        self.show_tags(index.names())
 
     def fetch_tag(self, result):
-        if result.strip() == "":
+        self.show_tags(result.rstrip().split("\n") if result.strip() else [])
+
+    def show_tags(self, tags):
+        if not tags:
             sublime.status_message("No Tags provided.")
             return
-        self.results = result.rstrip().split("\n")
+        self.results = tags
         self.quick_panel(self.results, self.panel_done)
 
+
+class GitDeleteTagCommand(GitTagPanel, GitWindowCommand):
     def panel_done(self, picked):
         if 0 > picked < len(self.results):
             return
@@ -133,14 +185,7 @@ class GitDeleteTagCommand(GitWindowCommand):
             self.run_command(["git", "tag", "-d", picked_tag])
 
 
-class GitShowTagsCommand(GitWindowCommand):
-    def run(self):
-        self.run_command(["git", "tag"], self.fetch_tag)
-
-    def fetch_tag(self, result):
-        self.results = result.rstrip().split("\n")
-        self.quick_panel(self.results, self.panel_done)
-
+class GitShowTagsCommand(GitTagPanel, GitWindowCommand):
     def panel_done(self, picked):
         if 0 > picked < len(self.results):
             return
@@ -149,17 +194,7 @@ class GitShowTagsCommand(GitWindowCommand):
         self.run_command(["git", "show", picked_tag])
 
 
-class GitCheckoutTagCommand(GitWindowCommand):
-    def run(self):
-        self.run_command(["git", "tag"], self.fetch_tag)
-
-    def fetch_tag(self, result):
-        if result.strip() == "":
-            sublime.status_message("No Tags provided.")
-            return
-        self.results = result.rstrip().split("\n")
-        self.quick_panel(self.results, self.panel_done)
-
+class GitCheckoutTagCommand(GitTagPanel, GitWindowCommand):
     def panel_done(self, picked):
         if 0 > picked < len(self.results):
             return
@@ -172,6 +207,13 @@ class GitPullCurrentBranchCommand(GitWindowCommand):
     command_to_run_after_describe = "pull"
 
     def run(self):
+        git_dir = self.get_git_dir()
+        branch = git_dir and current_branch(git_dir)
+        if branch:
+            self.current_branch = branch
+            self.show_remotes(read_config(git_dir).subsections("remote"))
+            return
+        # Detached HEAD, let git work out a name for it
         self.run_command(
             ["git", "describe", "--contains", "--all", "HEAD"],
             callback=self.describe_done,
@@ -182,7 +224,10 @@ class GitPullCurrentBranchCommand(GitWindowCommand):
         self.run_command(["git", "remote"], callback=self.remote_done)
 
     def remote_done(self, result):
-        self.remotes = result.rstrip().split("\n")
+        self.show_remotes(result.rstrip().split("\n"))
+
+    def show_remotes(self, remotes):
+        self.remotes = remotes
         if len(self.remotes) == 1:
             self.panel_done()
         else:
@@ -9,6 +9,11 @@ def pkg_settings():
 
 
 PKG_SETTINGS_KEY_CUSTOMBLAMEFLAGS = "custom_blame_flags"
+PKG_SETTINGS_KEY_BLAME_FLAGS = "blame_flags"
+PKG_SETTINGS_KEY_BLAME_UPGRADE_BUDGET = "blame_upgrade_budget_ms"
 
 PKG_SETTINGS_KEY_INLINE_BLAME_ENABLED = "inline_blame_enabled"
 PKG_SETTINGS_KEY_INLINE_BLAME_DELAY = "inline_blame_delay"
+
+PKG_SETTINGS_KEY_BLAME_WARMER_ENABLED = "blame_warmer_enabled"
+PKG_SETTINGS_KEY_BLAME_WARMER_COMMITS = "blame_warmer_commits"
@@ -31,6 +31,7 @@ class GitStashCommand(GitWindowCommand):
         self.run_command(
             ["git", "stash"] + self.command_to_run_after_list + [stash],
             self.handle_command or self.generic_done,
+            refresh=self.may_change_files,
             stash=stash,
         )
 
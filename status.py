@@ -11,7 +11,9 @@ class GitStatusCommand(GitWindowCommand):
     force_open = False
 
     def run(self):
-        self.run_command(["git", "status", "--porcelain"], self.status_done)
+        self.run_latest_command(
+            "status", ["git", "status", "--porcelain"], self.status_done
+        )
 
     def status_done(self, result: str):
         self.results: List[str] = list(
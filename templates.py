@@ -6,7 +6,7 @@ blame_phantom_html_template = """
             <span class="message">
                 <strong>Git Blame</strong> ({author})
                 {date} {time} |
-                <a href="prev?sha={qs_sha_val}&amp;row_num={qs_row_num_val}&amp;{qs_skip_keyvals}">[Prev]</a>
+                <a href="prev?row_num={qs_row_num_val}&amp;index={qs_index_val}">[Prev]</a>{next_link}
                 {sha}{sha_not_latest_indicator}
                 <a href="copy?sha={qs_sha_val}">[Copy]</a>
                 <a href="show?sha={qs_sha_val}">[Show]</a>
@@ -16,6 +16,9 @@ blame_phantom_html_template = """
     </body>
 """
 
+blame_next_link_template = """
+                <a href="next?row_num={qs_row_num_val}&amp;index={qs_index_val}">[Next]</a>"""
+
 blame_phantom_css = """
     div.phantom-arrow {
         border-top: 0.4rem solid transparent;
@@ -74,3 +77,17 @@ blame_inline_phantom_css = """
         text-decoration: inherit;
     }
 """
+
+# ------------------------------------------------------------
+
+# One phantom per line. Every hunk of a commit renders the same for a given
+# dim state, so blame-all builds each of these once and reuses it. The line
+# names its classes, css is the rules of just those.
+blame_all_phantom_html_template = """<body id="blame-all" class="{classes}"><style>{css}</style><a href="{sha}"><span class="{text_classes}">{text}</span></a></body>"""
+
+# Kept on one line without spaces, every phantom carries it
+blame_all_phantom_css = """body{{padding:0 6px 4px 0;margin:0}}a{{text-decoration:none}}{rules}"""
+# The commit's color at a dim level, on the border
+blame_all_phantom_color_rule = """.{color}-{dim}{{border-right:5px solid color(var(--{color}) blend(var(--background) {dim}%))}}"""
+# The text at a dim level, undimmed needs no class
+blame_all_phantom_text_rule = """.text-{dim}{{color:color(var(--foreground) blend(var(--background) {dim}%))}}"""
@@ -0,0 +1,70 @@
+# Checks of the plugin against the fake editor in bench/fakes, headless.
+#
+#   python3 -m unittest discover tests
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "bench")
+)
+
+from loader import load, load_plugins  # noqa: E402
+
+import sublime  # isort:skip, the fake one loader put on the path
+
+
+class BlameAllFailureTest(unittest.TestCase):
+    # Blame-all of a file git can't blame, in a repository with no commits
+
+    def setUp(self):
+        load_plugins()
+        self.directory = tempfile.TemporaryDirectory()
+        subprocess.check_call(["git", "init", "-q", self.directory.name])
+        self.path = os.path.join(self.directory.name, "untracked.txt")
+        with open(self.path, "w") as f:
+            f.write("untracked\n")
+        self.view = sublime.active_window().open_file(self.path)
+        sublime.run_until_idle()
+
+    def tearDown(self):
+        self.view.close()
+        self.directory.cleanup()
+
+    def test_error_reaches_the_user(self):
+        blame_all = load("blame_all")
+        command = blame_all.BlameShowAll(self.view)
+        errors = len(sublime.error_messages)
+        # The fake error dialog prints
+        with contextlib.redirect_stdout(io.StringIO()):
+            command.run(None)
+            # A progress status that is never stopped keeps scheduling itself
+            # until the deadline
+            sublime.run_until_idle(timeout=10.0)
+        self.assertEqual(len(sublime.error_messages), errors + 1)
+        self.assertIn("Git blame", sublime.error_messages[-1])
+        self.assertEqual(self.view.get_status(blame_all.PROGRESS_STATUS_KEY), "")
+        self.assertFalse(command.pending)
+
+    def test_hover_without_message(self):
+        blame_all = load("blame_all")
+        settings = self.view.settings()
+        settings.set(blame_all.VIEW_SETTINGS_KEY_PHANTOM_ALL_DISPLAYED, True)
+        # Not a commit of this repository, so git can't find its message
+        blame_all.line_blames[self.view.id()] = blame_all.LineBlame(["1234567"])
+        blame_all.BlameWatcher(self.view).on_hover(0, sublime.HOVER_TEXT)
+        sublime.run_until_idle()
+        self.assertIn("Commit message unavailable", self.view._state.popup)
+        # Failed lately, so the next hover doesn't run git but still says so
+        self.view.hide_popup()
+        blame_all.BlameWatcher(self.view).on_hover(0, sublime.HOVER_TEXT)
+        sublime.run_until_idle()
+        self.assertIn("Commit message unavailable", self.view._state.popup)
+
+
+if __name__ == "__main__":
+    unittest.main()